@@ -1,8 +1,9 @@
 # Smart_feeder.py
-import subprocess
 import pymysql
-import requests
 import os
+import threading
+import feeder_db
+from feeder_motor import MotorClient
 from datetime import datetime, timedelta
 # import re
 # import time
@@ -10,18 +11,7 @@ from datetime import datetime, timedelta
 
 def get_feed_interval(user_id):
     try:
-        with pymysql.connect(
-                host=os.getenv('DB_HOST', 'localhost'),
-                user=os.getenv('DB_USER', 'root'),
-                password=os.getenv('DB_PASSWORD', '5611'),
-                db=os.getenv('DB_NAME', 'feeder'),
-                charset='utf8'
-        ) as conn:
-            with conn.cursor() as cursor:
-                sql = "SELECT interval_minutes FROM feed_interval WHERE user_id = %s"
-                cursor.execute(sql, (user_id,))
-                result = cursor.fetchone()
-                return result[0] if result else None
+        return feeder_db.get_feed_interval(user_id)  # 캐시에서 조회, 없으면 DB에서 읽어옴
     except Exception as e:
         print(f"Error getting feed interval: {e}")
         return None
@@ -30,119 +20,159 @@ def get_feed_interval(user_id):
 # 앱의 2번째 화면 기능 구현 1) User의 시간 제한 설정
 def is_time_restricted(user_id):
     try:
-        with pymysql.connect(
-                host=os.getenv('DB_HOST', 'localhost'),
-                user=os.getenv('DB_USER', 'root'),
-                password=os.getenv('DB_PASSWORD', '5611'),
-                db=os.getenv('DB_NAME', 'feeder'),
-                charset='utf8'
-        ) as conn:
-            with conn.cursor() as cursor:
-                # 사용자의 시간 제한 설정을 가져옴
-                sql = "SELECT start_time, end_time FROM time_restriction WHERE user_id = %s"
-                cursor.execute(sql, (user_id,))
-                result = cursor.fetchone()
-
-                if result:
-                    start_time, end_time = result
-                    now = datetime.now().time()  # 현재 시간
-                    # 현재 시간이 사용자가 설정한 시간 제한 내에 있는지 확인
-                    return start_time <= now <= end_time
-
-                return False  # 설정이 없다면 restriction 없음
-
-                # else:
-                #     # 설정이 없다면 기본값 사용
-                #     now = datetime.now()
-                #     return now.hour >= 1 or now.hour < 2  # 오전 1시 ~ 2시 사이에는 배급 금지
-    except pymysql.MySQLError as e:
-        print("ERROR: ", e)
-        return False
-
-# 짧은 시간동안 발생하는 모터의 오작동을 방지하기 위한 함수
-def can_proceed(breed):
-    try:
-        with pymysql.connect(
-                host=os.getenv('DB_HOST', 'localhost'),
-                user=os.getenv('DB_USER', 'root'),
-                password=os.getenv('DB_PASSWORD', '5611'),
-                db=os.getenv('DB_NAME', 'feeder'),
-                charset='utf8'
-        ) as conn:
-            with conn.cursor() as cursor:
-                # last_detection 테이블에서 해당 품종의 마지막 감지 시간을 가져옴
-                sql = "SELECT last_detected FROM last_detection WHERE breed = %s"
-                cursor.execute(sql, (breed,))
-                result = cursor.fetchone()
+        # 사용자의 시간 제한 설정을 가져옴 (캐시)
+        result = feeder_db.get_time_restriction(user_id)
 
-                now = datetime.now()
-
-                if result:
-                    last_detected = result[0]
-                    # 마지막으로 감지된 시간과 현재 시간을 비교
-                    remaining_time = timedelta(seconds=10) - (now - last_detected)
-                    if remaining_time > timedelta(seconds=0):
-                        remaining_seconds = int(remaining_time.total_seconds())
-                        print(f"{remaining_seconds}초가 남았습니다.")
-                        return False
+        if result:
+            start_time, end_time = result
+            now = datetime.now().time()  # 현재 시간
+            # 현재 시간이 사용자가 설정한 시간 제한 내에 있는지 확인
+            return start_time <= now <= end_time
 
+        return False  # 설정이 없다면 restriction 없음
 
+        # else:
+        #     # 설정이 없다면 기본값 사용
+        #     now = datetime.now()
+        #     return now.hour >= 1 or now.hour < 2  # 오전 1시 ~ 2시 사이에는 배급 금지
     except pymysql.MySQLError as e:
         print("ERROR: ", e)
         return False
 
+class CooldownTracker:
+    # In-process cooldown state per breed (debounce) and per user (feeding interval).
+    # Authoritative for feeding decisions; last_detection is only written behind by flush() and read once on load().
+    def __init__(self, debounce=timedelta(seconds=10), flush_interval=5.0):
+        self.debounce = debounce
+        self.flush_interval = flush_interval  # seconds between write-behind flushes
+        self.last_breed = {}  # breed: last feeding datetime
+        self.last_user = {}  # user_id: last feeding datetime
+        self._recovered = datetime.min  # latest last_detection row, used for users not seen since restart
+        self._dirty = {}  # breed: datetime not yet written to last_detection
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def load(self):
+        # Recover state from last_detection after a restart
+        try:
+            with feeder_db.get_pool().connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT breed, last_detected FROM last_detection")
+                    rows = cursor.fetchall()
+        except pymysql.MySQLError as e:
+            print("ERROR: ", e)
+            self._loaded = True  # decide from memory only rather than retrying on every frame
+            return
+        with self._lock:
+            for breed, t in rows:
+                if t and t > self.last_breed.get(breed, datetime.min):
+                    self.last_breed[breed] = t
+            self._recovered = max([self._recovered, *(t for _, t in rows if t)])
+            self._loaded = True
+
+    def remaining(self, breed, now=None):
+        # Debounce time left for breed, timedelta(0) if it may proceed
+        if not self._loaded:
+            self.load()
+        now = now or datetime.now()
+        with self._lock:
+            last = self.last_breed.get(breed)
+        return max(self.debounce - (now - last), timedelta(0)) if last else timedelta(0)
+
+    def interval_elapsed(self, user_id, interval, now=None):
+        # True if at least interval (minutes) passed since user_id was last fed
+        if not self._loaded:
+            self.load()
+        now = now or datetime.now()
+        with self._lock:
+            last = self.last_user.get(user_id, self._recovered)
+        return now - last >= timedelta(minutes=interval)
+
+    def record(self, breed, user_id, now=None):
+        # Record a feeding; last_detection is updated by the next flush()
+        now = now or datetime.now()
+        with self._lock:
+            self.last_breed[breed] = now
+            self.last_user[user_id] = now
+            self._dirty[breed] = now
+
+    def flush(self):
+        # Write pending cooldowns to last_detection, re-queueing them on failure
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return
+        try:
+            with feeder_db.get_pool().connection() as conn:
+                with conn.cursor() as cursor:
+                    sql = "INSERT INTO last_detection (breed, last_detected) VALUES (%s, %s) " \
+                          "ON DUPLICATE KEY UPDATE last_detected = GREATEST(last_detected, VALUES(last_detected))"
+                    cursor.executemany(sql, list(dirty.items()))
+        except pymysql.MySQLError as e:
+            print("ERROR: ", e)
+            with self._lock:
+                for breed, t in dirty.items():
+                    self._dirty.setdefault(breed, t)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def start(self):
+        # Start the write-behind flush thread
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        # Stop the flush thread after a final flush
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+
+cooldown = CooldownTracker()
+
+
+# 짧은 시간동안 발생하는 모터의 오작동을 방지하기 위한 함수
+def can_proceed(breed):
+    # 메모리의 CooldownTracker로 판단하므로 감지마다 DB를 조회하지 않습니다.
+    remaining_time = cooldown.remaining(breed)
+    if remaining_time > timedelta(seconds=0):
+        remaining_seconds = int(remaining_time.total_seconds())
+        print(f"{remaining_seconds}초가 남았습니다.")
+        return False
     return True
 
 
 def log_detection(breed):
     try:
-        with pymysql.connect(
-                host=os.getenv('DB_HOST', 'localhost'),
-                user=os.getenv('DB_USER', 'root'),
-                password=os.getenv('DB_PASSWORD', '5611'),
-                db=os.getenv('DB_NAME', 'feeder'),
-                charset='utf8'
-        ) as conn:
-            with conn.cursor() as cursor:
-                # 해당 breed의 DefaultFeedAmount 값을 가져옴
-                sql_retrieve = "SELECT DefaultFeedAmount FROM petbreed WHERE BreedName = %s"
-                cursor.execute(sql_retrieve, (breed,))
-                result = cursor.fetchone()
-
-                if not result:
-                    print(f"No DefaultFeedAmount found for {breed}")
-                    return
-
-                default_feed_amount = result[0]
+        # 해당 breed의 DefaultFeedAmount 값을 가져옴 (캐시)
+        default_feed_amount = feeder_db.get_default_feed_amount(breed)
 
-                now = datetime.now()
+        if default_feed_amount is None:
+            print(f"No DefaultFeedAmount found for {breed}")
+            return
 
-                # detection_log 테이블에 breed, time, FeedAmount 값을 추가
-                sql_log = "INSERT INTO detection_log (breed, time, FeedAmount) VALUES (%s, %s, %s)"
-                cursor.execute(sql_log, (breed, now, default_feed_amount))
-
-                # last_detection 테이블에 마지막으로 감지된 시각을 업데이트 또는 삽입
-                sql_last = "INSERT INTO last_detection (breed, last_detected) VALUES (%s, %s) ON DUPLICATE KEY UPDATE last_detected = %s"
-                cursor.execute(sql_last, (breed, now, now))
-
-                conn.commit()
+        # detection_log 기록은 백그라운드 LogWriter가 모아서 한 번에 INSERT 합니다 (감지 루프를 막지 않음).
+        # last_detection 테이블은 CooldownTracker.flush()가 기록합니다.
+        feeder_db.log_writer.start().write('detection_log', (breed, datetime.now(), default_feed_amount))
 
     except pymysql.MySQLError as e:
         print("ERROR: ", e)
 
 def update_default_feed_amount(breed, new_amount):
     try:
-        with pymysql.connect(
-                host=os.getenv('DB_HOST', 'localhost'),
-                user=os.getenv('DB_USER', 'root'),
-                password=os.getenv('DB_PASSWORD', '5611'),
-                db=os.getenv('DB_NAME', 'feeder'),
-                charset='utf8'
-        ) as conn:
+        with feeder_db.get_pool().connection() as conn:
             with conn.cursor() as cursor:
                 sql = "UPDATE petbreed SET DefaultFeedAmount = %s WHERE BreedName = %s"
                 cursor.execute(sql, (new_amount, breed))
-                conn.commit()
+                feeder_db.invalidate('petbreed', breed)  # 캐시된 급식량 무효화
                 if cursor.rowcount > 0:
                     print(f"Successfully updated feed amount for {breed} to {new_amount}")
                 else:
@@ -153,87 +183,83 @@ def update_default_feed_amount(breed, new_amount):
 
 def get_feed_amount(breed):
     try:
-        # MariaDB에 연결
-        with pymysql.connect(
-                host=os.getenv('DB_HOST', 'localhost'),
-                user=os.getenv('DB_USER', 'root'),
-                password=os.getenv('DB_PASSWORD', '5611'),
-                db=os.getenv('DB_NAME', 'feeder'),
-                charset='utf8'
-        ) as conn:
-            # print("Database connection successful!")  # 데이터베이스에 성공적으로 연결되었다는 메시지 출력
-            with conn.cursor() as cursor:
-                sql = "SELECT DefaultFeedAmount FROM petbreed WHERE BreedName = %s"
-                cursor.execute(sql, (breed,))
-                result = cursor.fetchone()
-                if result:
-                    print(f"Successfully retrieved feed amount for {breed}")  # 품종에 대한 피드 양을 성공적으로 검색한 경우
-                else:
-                    print(f"No feed amount found for {breed}")  # 품종에 대한 피드 양을 찾지 못한 경우
-                return result[0] if result else None
+        # 커넥션 풀 + 캐시를 사용하므로 정상 상태에서는 DB 왕복이 없습니다.
+        return feeder_db.get_default_feed_amount(breed)
     except Exception as e:
         print(f"Database error: {e}")  # 데이터베이스 연결 중에 발생한 오류 메시지 출력
         return None
 
 
-def control_motor(timer):
-    url = "https://c57f-58-231-94-94.ngrok-free.app/feed"  # 58.231.94.94 수정된 부분 -> ngrok 주소
-    data = {'timer': timer} # ex) {'timer' : 5000} 5초동안 모터 동작. 1000 = 1초
-    try:
-        response = requests.post(url, json=data, timeout=5)  # 수정된 부분
-        response.raise_for_status() # 오류코드 400 이상이면 에러
-    except requests.ConnectionError:
-        print(
-            "Error: Unable to connect to the server. Please check the server address and whether the server is running.")
-        return None
-    except requests.Timeout:
-        print(f"Error: Request to {url} timed out.")
-        return None
-    except requests.RequestException as e:
-        print(f"Error: An error occurred while sending the request. {str(e)}")
-        return None
+motor = MotorClient()  # keep-alive 세션을 재사용하는 모터 제어 클라이언트 (MOTOR_URL 환경변수로 주소 설정)
 
-    print(f"Success: Server responded with {response.status_code}.")
+def control_motor(timer):
+    # ex) control_motor(5000) 5초동안 모터 동작. 1000 = 1초
+    # 재시도와 데드라인은 MotorClient가 처리합니다. 감지 루프에서는 motor.submit()을 사용합니다.
+    motor.send(timer)
     return None
 
 DEFAULT_INTERVAL = 1 # 기본 배급 간격을 1분으로 설정
 
+FEEDER_WEIGHTS = os.getenv('FEEDER_WEIGHTS', 'best.pt')
+FEEDER_STREAM = os.getenv('FEEDER_STREAM', 'https://062c-58-231-94-94.ngrok-free.app/stream')  # 아두이노 카메라 스트림 주소
+FEEDER_MOTION_GATE = os.getenv('FEEDER_MOTION_GATE', '1') == '1'  # 빈 밥그릇 화면이 그대로면 추론을 건너뜁니다
+
+def create_detector():
+    # detect.py를 별도 프로세스로 실행하지 않고 같은 프로세스에서 모델을 한 번만 로드합니다.
+    from feeder_detector import FeederDetector
+    return FeederDetector(weights=FEEDER_WEIGHTS, source=FEEDER_STREAM, imgsz=(608, 608), conf_thres=0.85,
+                          motion_gate=FEEDER_MOTION_GATE)
+
+
+def handle_detection(detected_breed, user_id=1):
+    # 감지된 품종에 대해 급식 여부를 결정하고, 급식했다면 True를 반환합니다.
+    # detected_breed를 기반으로 can_proceed 함수를 호출하여
+    # 특정 시간이 지났는지 확인합니다.
+    if can_proceed(detected_breed):  # 특정 시간이 경과하였는지 확인합니다.
+        interval = get_feed_interval(user_id)
+        if interval is None:
+            interval = DEFAULT_INTERVAL # 기본 시간 간격 10초로 설정
+        if cooldown.interval_elapsed(user_id, interval):
+            if is_time_restricted(user_id):
+                print("Feeding is restricted at this time.")
+            else:
+                default_feed_amount = get_feed_amount(detected_breed)
+                if default_feed_amount:
+                    motor_runtime = default_feed_amount * 20 # 1g당 20ms로 설정
+                    motor.submit(motor_runtime)  # 모터 명령은 별도 스레드에서 전송 (프레임 손실 없음)
+                    cooldown.record(detected_breed, user_id)  # 마지막 피딩 시간 업데이트
+                    log_detection(detected_breed)  # 모터가 동작한 후에 감지 이력을 데이터베이스에 기록합니다.
+                    return True
+                else:
+                    print(f"No default feed amount found for breed: {detected_breed}")
+    return False
+
+
+def start():
+    cooldown.load()  # 재시작 시 last_detection 테이블에서 상태 복구
+    cooldown.start()
+    feeder_db.log_writer.start()
+
+
+def shutdown():
+    cooldown.stop()  # 남은 쿨다운 상태를 last_detection에 기록
+    feeder_db.log_writer.stop()  # 대기 중인 감지 이력 기록
+    motor.close()
+
+
 def main():
     try:
-        command = "python detect.py --weights best.pt --img 608 --conf 0.85 --source https://062c-58-231-94-94.ngrok-free.app/stream"
-        #아두이노에서 static ip 주소로 고정
-        process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-
-        user_id = 1
-        last_feeding_time = datetime.now() - timedelta(hours=24)  # 초기화, 최초 실행시 24시간 전으로 설정
-
-        for line in process.stdout:
-            if "Detected breed:" in line:
-                # "Detected breed:" 문자열 다음에 오는 문자열(품종 이름)을 추출합니다.
-                detected_breed = line.split("Detected breed:")[1].strip()
-                print(f"Extracted breed: {detected_breed}")
-
-                # 새로운 추가된 부분: detected_breed를 기반으로 can_proceed 함수를 호출하여
-                # 특정 시간이 지났는지 확인합니다.
-                if can_proceed(detected_breed):  # 특정 시간이 경과하였는지 확인합니다.
-                    interval = get_feed_interval(user_id)
-                    if interval is None:
-                        interval = DEFAULT_INTERVAL # 기본 시간 간격 10초로 설정
-                    if datetime.now() - last_feeding_time >= timedelta(minutes=interval):
-                        if is_time_restricted(user_id):
-                            print("Feeding is restricted at this time.")
-                        else:
-                            default_feed_amount = get_feed_amount(detected_breed)
-                            if default_feed_amount:
-                                motor_runtime = default_feed_amount * 20 # 1g당 20ms로 설정
-                                control_motor(motor_runtime)
-                                log_detection(detected_breed)  # 모터가 동작한 후에 감지 이력을 데이터베이스에 기록합니다.
-                                last_feeding_time = datetime.now()  # 마지막 피딩 시간 업데이트
-                            else:
-                                print(f"No default feed amount found for breed: {detected_breed}")
+        detector = create_detector()
+        start()
+
+        for event in detector:
+            print(f"Detected breed: {event.breed} ({event.conf:.2f})")
+            handle_detection(event.breed, user_id=1)
 
     except Exception as e:
         print(f"An error occurred: {e}")
+    finally:
+        shutdown()
 
 
 if __name__ == "__main__":
@@ -37,7 +37,6 @@ from pathlib import Path
 
 import torch
 import cv2
-import time
 import numpy as np
 import requests
 import re
@@ -50,9 +49,11 @@ if str(ROOT) not in sys.path:
 ROOT = Path(os.path.relpath(ROOT, Path.cwd()))  # relative
 
 from models.common import DetectMultiBackend
-from utils.dataloaders import IMG_FORMATS, VID_FORMATS, LoadImages, LoadScreenshots, LoadStreams
-from utils.general import (LOGGER, Profile, check_file, check_img_size, check_imshow, check_requirements, colorstr, cv2,
-                           increment_path, non_max_suppression, print_args, scale_boxes, strip_optimizer, xyxy2xywh)
+from utils.augmentations import Preprocessor
+from utils.dataloaders import IMG_FORMATS, VID_FORMATS, LoadImageBatches, LoadImages, LoadScreenshots, LoadStreams
+from utils.general import (LOGGER, MotionGate, Pipeline, Profile, check_file, check_img_size, check_imshow,
+                           check_requirements, colorstr, cv2, increment_path, non_max_suppression, print_args,
+                           scale_boxes, strip_optimizer, xyxy2xywh)
 from utils.plots import Annotator, colors, save_one_box
 from utils.torch_utils import select_device, smart_inference_mode
 
@@ -86,6 +87,16 @@ def run(
         half=False,  # use FP16 half-precision inference
         dnn=False,  # use OpenCV DNN for ONNX inference
         vid_stride=1,  # video frame-rate stride
+        frame_interval=1.0,  # minimum seconds between processed frames (video time for files), 0 for every frame
+        motion_gate=False,  # skip inference and keep the last result while the scene is unchanged
+        gate_threshold=0.01,  # changed pixel fraction that counts as motion
+        gate_hold=3,  # frames to keep running inference after motion stops
+        gate_refresh=10.0,  # seconds, force inference at least this often
+        gate_method='diff',  # 'diff' frame differencing or 'mog2' background subtraction
+        pipeline=0,  # run load/preprocess/infer/postprocess/sink on separate threads with this queue size, 0 for serial
+        batch_size=1,  # image directories: infer this many images per batch, decoded in parallel
+        stream_policy='latest',  # streams: 'latest' newest frame per stream, 'every' frame in order or 'sync'
+        stream_buffer=4,  # streams: frames buffered per stream for 'every' and 'sync'
 ):
     source = str(source)
     save_img = not nosave and not source.endswith('.txt')  # save inference images
@@ -110,67 +121,106 @@ def run(
     bs = 1  # batch_size
     if webcam:
         view_img = check_imshow(warn=True)
-        dataset = LoadStreams(source, img_size=imgsz, stride=stride, auto=pt, vid_stride=vid_stride)
+        dataset = LoadStreams(source,
+                              img_size=imgsz,
+                              stride=stride,
+                              auto=pt,
+                              vid_stride=vid_stride,
+                              interval=frame_interval,
+                              raw=True,
+                              policy=stream_policy,
+                              buffer=stream_buffer)
         bs = len(dataset)
     elif screenshot:
         dataset = LoadScreenshots(source, img_size=imgsz, stride=stride, auto=pt)
+    elif batch_size > 1:
+        dataset = LoadImageBatches(source, img_size=imgsz, stride=stride, auto=pt, batch_size=batch_size)
+        bs = batch_size
     else:
-        dataset = LoadImages(source, img_size=imgsz, stride=stride, auto=pt, vid_stride=vid_stride)
+        dataset = LoadImages(source,
+                             img_size=imgsz,
+                             stride=stride,
+                             auto=pt,
+                             vid_stride=vid_stride,
+                             interval=frame_interval,
+                             raw=True)
     vid_path, vid_writer = [None] * bs, [None] * bs
+    batched = webcam or isinstance(dataset, LoadImageBatches)  # items hold lists of paths and images
 
     # Run inference
     model.warmup(imgsz=(1 if pt or model.triton else bs, 3, *imgsz))  # warmup
-    seen, windows, dt = 0, [], (Profile(), Profile(), Profile())
-
-    frame_interval = 1  # 프레임 처리 간격을 2초로 설정
-    last_time = time.time()
-
-    for path, im, im0s, vid_cap, s in dataset:
-        current_time = time.time() # 추가된 코드
-        if current_time - last_time < frame_interval: # 추가된 코드
-            continue # 인터벌 시간이 지나지 않았으면 현재 프레임을 건너뛴다
-
-        last_time = current_time # 마지막으로 프레임을 처리한 시간을 업데이트
-
-        # 나머지 프레임 처리 코드는 이전과 동일
-        with dt[0]:
-            im = torch.from_numpy(im).to(model.device)
-            im = im.half() if model.fp16 else im.float()  # uint8 to fp16/32
-            im /= 255  # 0 - 255 to 0.0 - 1.0
-            if len(im.shape) == 3:
-                im = im[None]  # expand for batch dim
-
-        # Inference
-        with dt[1]:
-            visualize = increment_path(save_dir / Path(path).stem, mkdir=True) if visualize else False
-            pred = model(im, augment=augment, visualize=visualize)
-
+    seen, ran, windows, dt = 0, 0, [], (Profile(), Profile(), Profile())
+    gate = MotionGate(gate_threshold, gate_hold, gate_refresh, gate_method) if motion_gate else None
+    last_pred = None  # motion gate: predictions of the last inference
+    slots = pipeline + 2 if pipeline else 1  # input buffers in flight
+    prep = Preprocessor(imgsz, stride, auto=pt, device=model.device, half=model.fp16, slots=slots)
+
+    def load():
+        # Dataloader items with the frame number and video properties read at load time
+        for path, im, im0s, vid_cap, s in dataset:  # frames inside frame_interval are skipped by the dataloader
+            frame = dataset.count if webcam else getattr(dataset, 'frame', 0)
+            video = (vid_cap.get(cv2.CAP_PROP_FPS), int(vid_cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                     int(vid_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))) if vid_cap else None
+            streams = list(dataset.streams) if webcam else None  # stream indices, streams that are down are left out
+            yield {'path': path, 'im': im, 'im0s': im0s, 's': s, 'frame': frame, 'video': video, 'streams': streams,
+                   'mode': dataset.mode}  # read now, in pipeline mode the dataloader runs ahead of later stages
+
+    def preprocess(x):
+        ims = x['im0s'] if batched else [x['im0s']]
+        raw = x['im'] is None  # raw dataloaders leave letterboxing to prep
+        x['shape'] = prep.shape(ims) if raw else x['im'].shape[-2:]  # inference shape
+        x['gated'] = gate is not None and not gate(ims, x['streams'])
+        if not x['gated']:
+            with dt[0]:
+                x['im'] = prep(ims) if raw else prep.tensor(x['im'])  # letterbox and normalize into reused buffers
+        return x
+
+    @smart_inference_mode()
+    def infer(x):
+        if not x['gated']:
+            with dt[1]:
+                v = increment_path(save_dir / Path(x['path']).stem, mkdir=True) if visualize else False
+                x['pred'] = model(x['im'], augment=augment, visualize=v)
+            x['ms'] = dt[1].dt * 1E3
+        return x
+
+    @smart_inference_mode()
+    def postprocess(x):
+        nonlocal seen, ran, last_pred
         # NMS
-        with dt[2]:
-            pred = non_max_suppression(pred, conf_thres, iou_thres, classes, agnostic_nms, max_det=max_det)
+        if x['gated']:  # the gate always opens on the first frame, so last_pred is set
+            pred = [p.clone() for p in last_pred]  # unchanged scene: reuse the last result
+        else:
+            with dt[2]:
+                pred = non_max_suppression(x['pred'], conf_thres, iou_thres, classes, agnostic_nms, max_det=max_det)
+            ran += len(pred)
+            if gate is not None:
+                last_pred = [p.clone() for p in pred]  # before boxes are rescaled in place
 
         # Second-stage classifier (optional)
         # pred = utils.general.apply_classifier(pred, classifier_model, im, im0s)
 
         # Process predictions
+        path, im0s, s, frame, shape = x['path'], x['im0s'], x['s'], x['frame'], x['shape']
+        x['results'] = []  # (stream index, path, annotated image)
         for i, det in enumerate(pred):  # per image
             seen += 1
-            if webcam:  # batch_size >= 1
-                p, im0, frame = path[i], im0s[i].copy(), dataset.count
-                s += f'{i}: '
+            k = x['streams'][i] if webcam else i  # stream index
+            if batched:  # batch_size >= 1
+                p, im0 = path[i], im0s[i].copy()
+                s += f'{k}: '
             else:
-                p, im0, frame = path, im0s.copy(), getattr(dataset, 'frame', 0)
+                p, im0 = path, im0s.copy()
 
             p = Path(p)  # to Path
-            save_path = str(save_dir / p.name)  # im.jpg
-            txt_path = str(save_dir / 'labels' / p.stem) + ('' if dataset.mode == 'image' else f'_{frame}')  # im.txt
-            s += '%gx%g ' % im.shape[2:]  # print string
+            txt_path = str(save_dir / 'labels' / p.stem) + ('' if x['mode'] == 'image' else f'_{frame}')  # im.txt
+            s += '%gx%g ' % shape  # print string
             gn = torch.tensor(im0.shape)[[1, 0, 1, 0]]  # normalization gain whwh
             imc = im0.copy() if save_crop else im0  # for save_crop
             annotator = Annotator(im0, line_width=line_thickness, example=str(names))
             if len(det):
                 # Rescale boxes from img_size to im0 size
-                det[:, :4] = scale_boxes(im.shape[2:], det[:, :4], im0.shape).round()
+                det[:, :4] = scale_boxes(shape, det[:, :4], im0.shape).round()
 
                 # Print results
                 for c in det[:, 5].unique():
@@ -195,8 +245,13 @@ def run(
                     if save_crop:
                         save_one_box(xyxy, imc, file=save_dir / 'crops' / names[c] / f'{p.stem}.jpg', BGR=True)
 
+            x['results'].append((k, p, annotator.result()))
+        x['s'], x['det'] = s, len(det)
+        return x
+
+    def sink(x):
+        for i, p, im0 in x['results']:
             # Stream results
-            im0 = annotator.result()
             if view_img:
                 if platform.system() == 'Linux' and p not in windows:
                     windows.append(p)
@@ -207,17 +262,16 @@ def run(
 
             # Save results (image with detections)
             if save_img:
-                if dataset.mode == 'image':
+                save_path = str(save_dir / p.name)  # im.jpg
+                if x['mode'] == 'image':
                     cv2.imwrite(save_path, im0)
                 else:  # 'video' or 'stream'
                     if vid_path[i] != save_path:  # new video
                         vid_path[i] = save_path
                         if isinstance(vid_writer[i], cv2.VideoWriter):
                             vid_writer[i].release()  # release previous video writer
-                        if vid_cap:  # video
-                            fps = vid_cap.get(cv2.CAP_PROP_FPS)
-                            w = int(vid_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                            h = int(vid_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+                        if x['video']:  # video
+                            fps, w, h = x['video']
                         else:  # stream
                             fps, w, h = 30, im0.shape[1], im0.shape[0]
                         save_path = str(Path(save_path).with_suffix('.mp4'))  # force *.mp4 suffix on results videos
@@ -225,11 +279,31 @@ def run(
                     vid_writer[i].write(im0)
 
         # Print time (inference-only)
-        LOGGER.info(f"{s}{'' if len(det) else '(no detections), '}{dt[1].dt * 1E3:.1f}ms")
+        t = 'gated' if x['gated'] else f"{x['ms']:.1f}ms"
+        LOGGER.info(f"{x['s']}{'' if x['det'] else '(no detections), '}{t}")
+
+    stages = ('preprocess', preprocess), ('infer', infer), ('postprocess', postprocess), ('sink', sink)
+    if pipeline:  # stages on their own threads: frame N+1 is preprocessed and N-1 written while N is inferred
+        for p in dt:
+            p.cuda = False  # no per-stage device sync, per-image speeds below are host-side
+        pipe = Pipeline(stages, maxsize=pipeline)
+        for _ in pipe.run(load()):
+            pass
+    else:
+        for x in load():
+            for _, fn in stages:
+                x = fn(x)
 
     # Print results
-    t = tuple(x.t / seen * 1E3 for x in dt)  # speeds per image
+    t = tuple(x.t / max(ran, 1) * 1E3 for x in dt)  # speeds per inferred image
     LOGGER.info(f'Speed: %.1fms pre-process, %.1fms inference, %.1fms NMS per image at shape {(1, 3, *imgsz)}' % t)
+    LOGGER.info(prep.summary())
+    if webcam:
+        LOGGER.info(dataset.summary())
+    if gate is not None:
+        LOGGER.info(gate.summary(dt))
+    if pipeline:
+        LOGGER.info(pipe.summary())
     if save_txt or save_img:
         s = f"\n{len(list(save_dir.glob('labels/*.txt')))} labels saved to {save_dir / 'labels'}" if save_txt else ''
         LOGGER.info(f"Results saved to {colorstr('bold', save_dir)}{s}")
@@ -265,7 +339,21 @@ def parse_opt():
     parser.add_argument('--half', action='store_true', help='use FP16 half-precision inference')
     parser.add_argument('--dnn', action='store_true', help='use OpenCV DNN for ONNX inference')
     parser.add_argument('--vid-stride', type=int, default=1, help='video frame-rate stride')
+    parser.add_argument('--frame-interval', type=float, default=1.0, help='min seconds between frames, 0 for all')
+    parser.add_argument('--max-fps', type=float, help='target inference rate, overrides --frame-interval')
+    parser.add_argument('--motion-gate', action='store_true', help='skip inference while the scene is unchanged')
+    parser.add_argument('--gate-threshold', type=float, default=0.01, help='changed pixel fraction counted as motion')
+    parser.add_argument('--gate-hold', type=int, default=3, help='frames inferred after motion stops')
+    parser.add_argument('--gate-refresh', type=float, default=10.0, help='max seconds between inferences')
+    parser.add_argument('--gate-method', default='diff', choices=('diff', 'mog2'), help='motion gate method')
+    parser.add_argument('--pipeline', type=int, default=0, help='pipelined stages with this queue size, 0 for serial')
+    parser.add_argument('--batch-size', type=int, default=1, help='batched image-directory inference')
+    parser.add_argument('--stream-policy', default='latest', choices=('latest', 'every', 'sync'), help='streams')
+    parser.add_argument('--stream-buffer', type=int, default=4, help='streams: frames buffered per stream')
     opt = parser.parse_args()
+    if opt.max_fps:
+        opt.frame_interval = 1 / opt.max_fps
+    del opt.max_fps
     opt.imgsz *= 2 if len(opt.imgsz) == 1 else 1  # expand
     print_args(vars(opt))
     return opt
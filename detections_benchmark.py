@@ -0,0 +1,81 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""
+Microbenchmark Detections serialization cost per image: pandas records JSON vs the columnar zero-pandas paths
+
+Usage:
+    $ python detections_benchmark.py                   # 1 and 300 detections per image
+    $ python detections_benchmark.py --n 1 30 300 --iters 2000
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[0]  # YOLOv5 root directory
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))  # add ROOT to PATH
+
+from models.common import Detections
+from utils.general import Profile
+
+
+def synthetic(n, shape=(480, 640), nc=80):
+    # Detections for one image with n random boxes, like AutoShape output after NMS
+    h, w = shape
+    xy = torch.rand(n, 2) * torch.tensor([w, h])
+    wh = torch.rand(n, 2) * torch.tensor([w, h]) / 4
+    pred = torch.cat((xy, xy + wh, torch.rand(n, 1), torch.randint(0, nc, (n, 1)).float()), 1)
+    names = {i: f'class{i}' for i in range(nc)}
+    return Detections([np.zeros((h, w, 3), np.uint8)], [pred], ['image0.jpg'], (Profile(), ) * 3, names, (1, 3, h, w))
+
+
+def timeit(fn, iters):
+    fn()  # warmup
+    t = time.perf_counter()
+    for _ in range(iters):
+        fn()
+    return (time.perf_counter() - t) / iters * 1E6  # µs per call
+
+
+def run(n=(1, 300), iters=1000):
+    try:
+        import msgpack  # noqa: F401
+    except ImportError:
+        msgpack = None
+    rows = []
+    for k in n:
+        d = synthetic(k)
+        paths = {
+            'pandas records JSON': lambda: d.pandas().xyxy[0].to_json(orient='records'),
+            'numpy columns': lambda: d.numpy(),
+            'to_json': lambda: d.to_json(),
+            'to_msgpack': (lambda: d.to_msgpack()) if msgpack else None}
+        for name, fn in paths.items():
+            if fn is not None:
+                rows.append((k, name, timeit(fn, iters), len(fn()) if name not in ('numpy columns', ) else None))
+
+    print(f"{'detections':>10}  {'path':<22}{'µs/image':>10}{'bytes':>10}")
+    for k, name, us, size in rows:
+        print(f"{k:>10}  {name:<22}{us:>10.1f}{size if size is not None else '-':>10}")
+    return rows
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n', type=int, nargs='+', default=[1, 300], help='detections per image')
+    parser.add_argument('--iters', type=int, default=1000, help='timed iterations per path')
+    return parser.parse_args()
+
+
+def main(opt):
+    run(opt.n, opt.iters)
+
+
+if __name__ == '__main__':
+    opt = parse_opt()
+    main(opt)
@@ -0,0 +1,476 @@
+# feeder_db.py
+
+"""
+Shared MySQL connection pool and read-through caches for the smart feeder
+
+Usage:
+    from feeder_db import get_pool, get_default_feed_amount, invalidate
+    with get_pool().connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+    amount = get_default_feed_amount('Beagle')  # cached, no DB round trip after the first call
+    invalidate('petbreed', 'Beagle')  # after writing petbreed
+    log_writer.start().write('detection_log', (breed, datetime.now(), amount))  # batched, non-blocking
+"""
+
+import contextlib
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pymysql
+from pymysql.constants import SERVER_STATUS
+
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'user': os.getenv('DB_USER', 'root'),
+    'password': os.getenv('DB_PASSWORD', '5611'),
+    'db': os.getenv('DB_NAME', 'feeder'),
+    'charset': 'utf8'}
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 4))  # connections kept open per process
+DB_CACHE_TTL = float(os.getenv('DB_CACHE_TTL', 60))  # seconds before a cached setting is re-read
+SPILL_FILE = Path(os.getenv('DB_SPILL_FILE', Path(__file__).resolve().parent / 'runs/feeder/log_spill.ndjson'))
+
+
+class ConnectionPool:
+    # Thread-safe pool of reusable pymysql connections, i.e. 'with pool.connection() as conn:'
+    def __init__(self, size=DB_POOL_SIZE, idle_ping=60.0, **kwargs):
+        self.size = size
+        self.idle_ping = idle_ping  # ping connections idle for longer than this many seconds
+        self.kwargs = {**DB_CONFIG, 'autocommit': True, **kwargs}  # use conn.begin()/commit() for transactions
+        self._idle = queue.LifoQueue(maxsize=size)  # (connection, last used time), most recent first
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def _acquire(self, timeout):
+        try:
+            conn, t = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            if create:
+                return self._connect()
+            try:
+                conn, t = self._idle.get(timeout=timeout)
+            except queue.Empty:
+                raise pymysql.OperationalError(f'No free database connection after {timeout}s') from None
+        if time.monotonic() - t > self.idle_ping:
+            try:
+                conn.ping(reconnect=True)  # server may have closed an idle connection
+            except Exception:
+                with contextlib.suppress(Exception):
+                    conn.close()
+                return self._connect()  # fresh connection in the same slot, released if that fails too
+        return conn
+
+    def _connect(self):
+        # Open a connection for a slot already counted in _created, releasing the slot if connecting fails
+        try:
+            return pymysql.connect(**self.kwargs)
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def _discard(self, conn):
+        with contextlib.suppress(Exception):
+            conn.close()
+        with self._lock:
+            self._created -= 1
+
+    @contextlib.contextmanager
+    def connection(self, timeout=10.0):
+        conn = self._acquire(timeout)
+        try:
+            yield conn
+        except pymysql.MySQLError:
+            self._discard(conn)  # connection state is unknown after a driver error
+            raise
+        except BaseException:
+            if conn.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:  # abandoned conn.begin()
+                with contextlib.suppress(Exception):
+                    conn.rollback()
+            self._idle.put((conn, time.monotonic()))
+            raise
+        else:
+            self._idle.put((conn, time.monotonic()))
+
+    def close(self):
+        # Close all idle connections
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+
+class TTLCache:
+    # Thread-safe read-through cache with per-entry expiry and explicit invalidation
+    _missing = object()
+
+    def __init__(self, ttl=DB_CACHE_TTL):
+        self.ttl = ttl
+        self._data = {}  # key: (value, expiry time)
+        self._lock = threading.Lock()
+        self._generation = 0  # bumped by invalidate() so in-flight loads cannot re-insert stale values
+        self.hits = self.misses = 0
+
+    def get(self, key, loader):
+        # Return cached value for key, calling loader() on a miss or after expiry. None results are cached too
+        now = time.monotonic()
+        with self._lock:
+            value, expiry = self._data.get(key, (self._missing, 0))
+            if value is not self._missing and now < expiry:
+                self.hits += 1
+                return value
+            self.misses += 1
+            generation = self._generation
+        value = loader()
+        with self._lock:
+            if generation == self._generation:
+                self._data[key] = value, now + self.ttl
+        return value
+
+    def invalidate(self, *prefix):
+        # Drop entries whose key starts with prefix, i.e. invalidate('petbreed') or invalidate('petbreed', 'Beagle')
+        n = len(prefix)
+        with self._lock:
+            self._generation += 1
+            for k in [k for k in self._data if k[:n] == prefix]:
+                del self._data[k]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+cache = TTLCache()
+
+
+def get_pool():
+    # Process-wide connection pool, created on first use
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+
+def invalidate(table, key=None):
+    # Invalidate cached rows of table (petbreed, feed_interval, time_restriction) after a write
+    if key is None:
+        cache.invalidate(table)
+    else:
+        cache.invalidate(table, key)
+
+
+def _fetchone(sql, args):
+    with get_pool().connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(sql, args)
+            return cursor.fetchone()
+
+
+def _as_time(x):
+    # pymysql returns TIME columns as timedelta
+    return (datetime.min + x).time() if isinstance(x, timedelta) else x
+
+
+def get_default_feed_amount(breed):
+    # petbreed.DefaultFeedAmount for breed, or None
+    def load():
+        result = _fetchone("SELECT DefaultFeedAmount FROM petbreed WHERE BreedName = %s", (breed,))
+        return result[0] if result else None
+
+    return cache.get(('petbreed', breed), load)
+
+
+def get_feed_interval(user_id):
+    # feed_interval.interval_minutes for user_id, or None
+    def load():
+        result = _fetchone("SELECT interval_minutes FROM feed_interval WHERE user_id = %s", (user_id,))
+        return result[0] if result else None
+
+    return cache.get(('feed_interval', user_id), load)
+
+
+def get_time_restriction(user_id):
+    # (start_time, end_time) from time_restriction for user_id, or None
+    def load():
+        result = _fetchone("SELECT start_time, end_time FROM time_restriction WHERE user_id = %s", (user_id,))
+        return (_as_time(result[0]), _as_time(result[1])) if result else None
+
+    return cache.get(('time_restriction', user_id), load)
+
+
+ROLLUP_RESOLUTIONS = {  # resolution: (bucket start for a datetime, MySQL DATE_FORMAT used for backfill)
+    'minute': (lambda t: t.replace(second=0, microsecond=0), '%Y-%m-%d %H:%i:00'),
+    'hour': (lambda t: t.replace(minute=0, second=0, microsecond=0), '%Y-%m-%d %H:00:00'),
+    'day': (lambda t: t.replace(hour=0, minute=0, second=0, microsecond=0), '%Y-%m-%d 00:00:00')}
+ROLLUP_DDL = """CREATE TABLE IF NOT EXISTS detection_rollup (
+    resolution VARCHAR(8) NOT NULL,
+    bucket DATETIME NOT NULL,
+    breed VARCHAR(64) NOT NULL,
+    counts INT NOT NULL DEFAULT 0,
+    feed_amount DOUBLE NOT NULL DEFAULT 0,
+    PRIMARY KEY (resolution, bucket, breed))"""
+_rollups_ready = False
+
+
+def rollup(rows):
+    # Aggregate detection_log rows (breed, time, FeedAmount) into [(resolution, bucket, breed, counts, feed_amount)]
+    buckets = {}
+    for breed, t, amount in rows:
+        for resolution, (floor, _) in ROLLUP_RESOLUTIONS.items():
+            k = resolution, floor(t), breed
+            n, a = buckets.get(k, (0, 0.0))
+            buckets[k] = n + 1, a + float(amount or 0)
+    return [(*k, n, a) for k, (n, a) in buckets.items()]
+
+
+def ensure_rollups():
+    # Create detection_rollup once per process and backfill it from detection_log if it is empty
+    global _rollups_ready
+    if _rollups_ready:
+        return
+    with get_pool().connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(ROLLUP_DDL)
+            cursor.execute("SELECT 1 FROM detection_rollup LIMIT 1")
+            if cursor.fetchone() is None:
+                backfill_rollups(cursor)
+    _rollups_ready = True
+
+
+def backfill_rollups(cursor):
+    # Rebuild every rollup resolution from detection_log (idempotent)
+    for resolution, (_, fmt) in ROLLUP_RESOLUTIONS.items():
+        cursor.execute(
+            "INSERT INTO detection_rollup (resolution, bucket, breed, counts, feed_amount) "
+            "SELECT %s, DATE_FORMAT(time, %s) AS b, breed, COUNT(*), COALESCE(SUM(FeedAmount), 0) "
+            "FROM detection_log GROUP BY b, breed "
+            "ON DUPLICATE KEY UPDATE counts = VALUES(counts), feed_amount = VALUES(feed_amount)", (resolution, fmt))
+
+
+class LogWriter:
+    # Background write-behind writer for log tables, i.e. log_writer.write('detection_log', (breed, now, amount))
+    # Rows are queued without blocking and inserted with multi-row executemany() when batch_size rows are queued or
+    # flush_interval seconds have passed. Rows that cannot be written (queue full or MySQL down) are spilled to an
+    # NDJSON file by the writer thread and replayed in batch_size chunks on the following flush ticks.
+    INSERTS = {
+        'detection_log': "INSERT INTO detection_log (breed, time, FeedAmount) VALUES (%s, %s, %s)"}
+
+    def __init__(self, maxsize=10000, batch_size=100, flush_interval=1.0, spill=SPILL_FILE, replay_backoff=10.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill = Path(spill)
+        self.replay_backoff = replay_backoff  # seconds between replay attempts after a failed one
+        self._replay_at = 0.0  # monotonic time of the next replay attempt
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._overflow = queue.Queue(maxsize=maxsize)  # rows for the writer thread to spill while _queue is full
+        self._spill_lock = threading.Lock()  # spill file and metrics, never held during database calls
+        self._thread = None
+        self._stop = threading.Event()
+        self.metrics = {'queued': 0, 'written': 0, 'spilled': 0, 'replayed': 0, 'malformed': 0, 'dropped': 0,
+                        'failures': 0, 'high_water': 0, 'last_flush_ms': 0.0}
+        self.listeners = []  # callables receiving the table name after rows were written to it
+
+    def write(self, table, row):
+        # Queue one row for table, never blocks the caller
+        assert table in self.INSERTS, f'unknown log table {table}'
+        try:
+            self._queue.put_nowait((table, tuple(row)))
+            with self._spill_lock:
+                self.metrics['queued'] += 1
+                self.metrics['high_water'] = max(self.metrics['high_water'], self._queue.qsize())
+        except queue.Full:  # backpressure: bounded memory, the writer thread moves the overflow to disk
+            try:
+                self._overflow.put_nowait((table, tuple(row)))
+            except queue.Full:
+                self._count('dropped')
+
+    def stats(self):
+        # Backpressure metrics: queue depth and capacity plus counters
+        with self._spill_lock:
+            metrics = dict(self.metrics)
+        spill_bytes = sum(f.stat().st_size for f in (self.spill, self._replaying) if f.exists())
+        return {**metrics, 'depth': self._queue.qsize(), 'capacity': self._queue.maxsize,
+                'overflow': self._overflow.qsize(), 'spill_bytes': spill_bytes}
+
+    @property
+    def _replaying(self):
+        return self.spill.with_suffix('.replay')  # spill file moved aside while it is replayed
+
+    def _count(self, key, n=1):
+        with self._spill_lock:
+            self.metrics[key] += n
+
+    def _spill(self, events):
+        if not events:
+            return
+        with self._spill_lock:
+            try:
+                self.spill.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.spill, 'a') as f:
+                    for table, row in events:
+                        f.write(json.dumps([table, [x.isoformat() if isinstance(x, datetime) else x for x in row]],
+                                           default=str) + '\n')
+                self.metrics['spilled'] += len(events)
+            except OSError as e:
+                print(f"Error spilling {len(events)} log rows to {self.spill}: {e}")
+
+    def _insert(self, events):
+        # Insert events grouped by table in one transaction, raises pymysql.MySQLError on failure
+        tables = {}
+        for table, row in events:
+            tables.setdefault(table, []).append(row)
+        if 'detection_log' in tables:
+            ensure_rollups()  # created (and backfilled) before the first incremental update
+        with get_pool().connection() as conn:
+            conn.begin()
+            with conn.cursor() as cursor:
+                for table, rows in tables.items():
+                    cursor.executemany(self.INSERTS[table], rows)
+                if 'detection_log' in tables:  # keep detection_rollup in step, in the same transaction
+                    cursor.executemany(
+                        "INSERT INTO detection_rollup (resolution, bucket, breed, counts, feed_amount) "
+                        "VALUES (%s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE "
+                        "counts = counts + VALUES(counts), feed_amount = feed_amount + VALUES(feed_amount)",
+                        rollup(tables['detection_log']))
+            conn.commit()
+
+    def _replay(self):
+        # Re-insert spilled rows once MySQL is reachable again, reading batch_size lines at a time. The spill file is
+        # moved aside first, so rows spilled meanwhile go to a new file; malformed lines are logged and skipped
+        replaying = self._replaying
+        while True:
+            with self._spill_lock:
+                if not replaying.exists():
+                    if not self.spill.exists():
+                        return
+                    os.replace(self.spill, replaying)
+            with open(replaying) as f:
+                while True:
+                    lines = list(itertools.islice(f, self.batch_size))
+                    if not lines:
+                        break
+                    events = []
+                    for line in lines:
+                        try:
+                            table, row = json.loads(line)
+                            assert table in self.INSERTS, f'unknown log table {table}'
+                            events.append((table, tuple(_from_iso(x) for x in row)))
+                        except (ValueError, TypeError, AssertionError) as e:  # partial or corrupt line
+                            self._count('malformed')
+                            print(f"Skipping malformed spilled log row {line.strip()[:200]!r}: {e}")
+                    try:
+                        if events:
+                            self._insert(events)
+                    except Exception:
+                        tmp = replaying.with_suffix('.tmp')
+                        with open(tmp, 'w') as rest:  # keep only rows not yet replayed
+                            rest.writelines(lines)
+                            rest.writelines(f)
+                        os.replace(tmp, replaying)
+                        raise
+                    self._count('replayed', len(events))
+            replaying.unlink()
+
+    @staticmethod
+    def _drain(q):
+        events = []
+        while True:
+            try:
+                events.append(q.get_nowait())
+            except queue.Empty:
+                return events
+
+    def _replay_due(self):
+        # Replay spilled rows on every flush tick, with or without new rows, waiting replay_backoff after a failure
+        if time.monotonic() < self._replay_at or not (self.spill.exists() or self._replaying.exists()):
+            return
+        try:
+            self._replay()
+        except Exception as e:
+            self._count('failures')
+            self._replay_at = time.monotonic() + self.replay_backoff
+            print(f"Error replaying spilled log rows from {self.spill}: {e}")
+
+    def flush(self):
+        # Drain queued rows into the database and replay spilled rows, returns number of rows written
+        self._spill(self._drain(self._overflow))  # rows write() could not queue, spilled here off the caller's thread
+        events = self._drain(self._queue)
+        if not events:
+            self._replay_due()
+            return 0
+        t = time.perf_counter()
+        tables = set()
+        try:
+            for i in range(0, len(events), self.batch_size):
+                self._insert(events[i:i + self.batch_size])
+                self._count('written', len(events[i:i + self.batch_size]))
+                tables.update(table for table, _ in events[i:i + self.batch_size])
+                events[i:i + self.batch_size] = [None] * len(events[i:i + self.batch_size])
+        except Exception as e:
+            self._count('failures')
+            print(f"Error writing log rows, spilling to {self.spill}: {e}")
+            self._spill([x for x in events if x is not None])
+        else:
+            self._replay_at = 0.0  # MySQL is reachable, retry the spill file now
+            self._replay_due()
+        with self._spill_lock:
+            self.metrics['last_flush_ms'] = (time.perf_counter() - t) * 1E3
+        for table in tables:
+            for listener in self.listeners:
+                with contextlib.suppress(Exception):
+                    listener(table)  # i.e. invalidate cached figures built from detection_log
+        return len(events)
+
+    def _run(self):
+        last = time.monotonic()
+        while not self._stop.is_set():
+            if self._queue.qsize() >= self.batch_size or self._overflow.qsize() or \
+                    time.monotonic() - last >= self.flush_interval:
+                self._flush_safe()
+                last = time.monotonic()
+            self._stop.wait(min(0.05, self.flush_interval))
+        self._flush_safe()
+
+    def _flush_safe(self):
+        # flush() for the background thread, which must survive any error
+        try:
+            self.flush()
+        except Exception as e:
+            self._count('failures')
+            print(f"Error in log writer flush: {e}")
+
+    def start(self):
+        # Start the background flush thread
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        # Stop the flush thread after a final flush
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+
+def _from_iso(x):
+    # Restore datetimes written by LogWriter._spill()
+    if isinstance(x, str):
+        with contextlib.suppress(ValueError):
+            return datetime.fromisoformat(x)
+    return x
+
+
+log_writer = LogWriter()
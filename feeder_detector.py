@@ -0,0 +1,138 @@
+# feeder_detector.py
+
+"""
+In-process YOLOv5 detection engine for the smart feeder
+
+Usage - generator:
+    from feeder_detector import FeederDetector
+    detector = FeederDetector('best.pt', 'https://example.com/stream', imgsz=(608, 608), conf_thres=0.85)
+    for event in detector:
+        print(event.breed, event.conf, event.xyxy, event.timestamp)
+
+Usage - callback:
+    detector.run(lambda event: print(event.breed))
+"""
+
+import sys
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+import torch
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[0]  # YOLOv5 root directory
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))  # add ROOT to PATH
+
+from models.common import DetectMultiBackend
+from utils.dataloaders import LoadStreams
+from utils.general import LOGGER, MotionGate, Profile, check_img_size, non_max_suppression, scale_boxes
+from utils.torch_utils import select_device, smart_inference_mode
+
+# One detected box: class name, class index, confidence, xyxy box in source pixels, stream, frame number, capture time
+DetectionEvent = namedtuple('DetectionEvent', ('breed', 'cls', 'conf', 'xyxy', 'source', 'frame', 'timestamp'))
+
+
+class FeederDetector:
+    # Long-lived detector: the model is loaded once and detections are yielded as DetectionEvent tuples
+    def __init__(
+            self,
+            weights='best.pt',  # model path or triton URL
+            source='0',  # stream URL, webcam index or *.streams file
+            data=ROOT / 'data/coco128.yaml',  # dataset.yaml path
+            imgsz=(608, 608),  # inference size (height, width)
+            conf_thres=0.85,  # confidence threshold
+            iou_thres=0.45,  # NMS IOU threshold
+            max_det=1000,  # maximum detections per image
+            device='',  # cuda device, i.e. 0 or 0,1,2,3 or cpu
+            classes=None,  # filter by class: classes=0, or classes=[0, 2, 3]
+            agnostic_nms=False,  # class-agnostic NMS
+            half=False,  # use FP16 half-precision inference
+            dnn=False,  # use OpenCV DNN for ONNX inference
+            vid_stride=1,  # video frame-rate stride
+            frame_interval=1.0,  # minimum seconds between processed frames, newest frame only
+            motion_gate=False,  # True or a MotionGate: repeat the last events instead of inference on unchanged frames
+    ):
+        self.source = str(source)
+        self.conf_thres, self.iou_thres, self.max_det = conf_thres, iou_thres, max_det
+        self.classes, self.agnostic_nms = classes, agnostic_nms
+        self.vid_stride = vid_stride
+        self.frame_interval = frame_interval
+        self.gate = MotionGate() if motion_gate is True else motion_gate or None
+        self.dt = Profile()  # pre-process, inference and NMS time
+        self._stop = threading.Event()
+        self.dataset = None  # LoadStreams of the running events() generator
+
+        # Load model once, reused for every frame
+        self.device = select_device(device)
+        self.model = DetectMultiBackend(weights, device=self.device, dnn=dnn, data=data, fp16=half)
+        self.stride, self.names, self.pt = self.model.stride, self.model.names, self.model.pt
+        self.imgsz = check_img_size(imgsz, s=self.stride)
+        self.model.warmup(imgsz=(1, 3, *self.imgsz))  # warmup
+
+    def __iter__(self):
+        return self.events()
+
+    @smart_inference_mode()
+    def events(self):
+        # Generator of DetectionEvent for every box on every processed frame, until stop() or stream end
+        self._stop.clear()
+        dataset = LoadStreams(self.source,
+                              img_size=self.imgsz,
+                              stride=self.stride,
+                              auto=self.pt,
+                              vid_stride=self.vid_stride,
+                              interval=self.frame_interval,
+                              policy='latest')  # frames inside frame_interval are grabbed but never decoded
+        self.dataset = dataset
+        last = None  # events of the last inference, repeated on gated frames
+        for path, im, im0s, _, _ in dataset:
+            if self._stop.is_set():
+                break
+            t = max(dataset.timestamps)  # capture time
+            if self.gate is not None and not self.gate(im0s, dataset.streams) and last is not None:
+                yield from (e._replace(frame=dataset.count, timestamp=t) for e in last)
+                continue
+
+            with self.dt:
+                im = torch.from_numpy(im).to(self.model.device)
+                im = im.half() if self.model.fp16 else im.float()  # uint8 to fp16/32
+                im /= 255  # 0 - 255 to 0.0 - 1.0
+                if len(im.shape) == 3:
+                    im = im[None]  # expand for batch dim
+
+                pred = self.model(im)
+                pred = non_max_suppression(pred, self.conf_thres, self.iou_thres, self.classes, self.agnostic_nms,
+                                           max_det=self.max_det)
+
+            last = []
+            for i, det in enumerate(pred):  # per stream
+                if not len(det):
+                    continue
+                det[:, :4] = scale_boxes(im.shape[2:], det[:, :4], im0s[i].shape).round()
+                t = dataset.timestamps[i]  # capture time of this stream's frame
+                for *xyxy, conf, cls in reversed(det.tolist()):
+                    c = int(cls)
+                    last.append(DetectionEvent(self.names[c], c, conf, tuple(xyxy), path[i], dataset.count, t))
+            yield from last
+
+    def run(self, callback):
+        # Blocking loop passing every DetectionEvent to callback(event)
+        for event in self.events():
+            try:
+                callback(event)
+            except Exception as e:
+                LOGGER.warning(f'WARNING ⚠️ Detection callback failed: {e}')
+
+    def health(self):
+        # Per-stream uptime, reconnects and frame latency of the running stream, see LoadStreams.health()
+        return self.dataset.health() if self.dataset is not None else []
+
+    def stop(self):
+        # Ask events() to stop after the current frame
+        self._stop.set()
+        if self.gate is not None:
+            LOGGER.info(self.gate.summary((self.dt, )))
+        if self.dataset is not None:
+            LOGGER.info(self.dataset.summary())
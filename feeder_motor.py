@@ -0,0 +1,125 @@
+# feeder_motor.py
+
+"""
+Motor control client for the feeder device /feed endpoint
+
+Usage:
+    from feeder_motor import MotorClient
+    motor = MotorClient('http://127.0.0.1:8000/feed')
+    motor.send(5000)  # blocking, returns True on success
+    future = motor.submit(5000)  # non-blocking, runs on the client's worker thread
+
+Usage - local stand-in device for testing:
+    $ python feeder_motor.py --serve --port 8000
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from requests.adapters import HTTPAdapter
+
+MOTOR_URL = os.getenv('MOTOR_URL', 'https://c57f-58-231-94-94.ngrok-free.app/feed')  # 58.231.94.94 -> ngrok 주소
+RETRY_STATUS = 429, 500, 502, 503, 504  # retried HTTP status codes, other 4xx fail immediately
+
+
+class MotorClient:
+    # Keep-alive HTTP client for motor commands with jittered retries, idempotency keys and a per-command deadline
+    def __init__(self, url=MOTOR_URL, deadline=10.0, attempt_timeout=3.0, retries=3, backoff=0.25):
+        self.url = url
+        self.deadline = deadline  # seconds budget for one command including retries
+        self.attempt_timeout = attempt_timeout  # seconds per HTTP attempt
+        self.retries = retries  # retries after the first attempt
+        self.backoff = backoff  # base backoff seconds, doubled per retry with +/-50% jitter
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.session.headers['ngrok-skip-browser-warning'] = '1'
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='motor')  # commands run in order
+
+    def send(self, timer, deadline=None):
+        # Run the motor for timer ms, i.e. {'timer': 5000} = 5 s. Returns True on success, False otherwise
+        key = uuid.uuid4().hex  # same key on every retry so the device can drop duplicates
+        end = time.monotonic() + (deadline or self.deadline)
+        for attempt in range(self.retries + 1):
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                r = self.session.post(self.url,
+                                      json={'timer': timer},
+                                      headers={'Idempotency-Key': key},
+                                      timeout=min(self.attempt_timeout, remaining))
+                if r.status_code not in RETRY_STATUS:
+                    r.raise_for_status()  # 오류코드 400 이상이면 에러
+                    print(f"Success: Server responded with {r.status_code}.")
+                    return True
+                print(f"Error: {self.url} responded with {r.status_code} (attempt {attempt + 1}).")
+            except requests.HTTPError as e:
+                print(f"Error: An error occurred while sending the request. {e}")
+                return False
+            except requests.ConnectionError:
+                print(f"Error: Unable to connect to {self.url} (attempt {attempt + 1}).")
+            except requests.Timeout:
+                print(f"Error: Request to {self.url} timed out (attempt {attempt + 1}).")
+            except requests.RequestException as e:
+                print(f"Error: An error occurred while sending the request. {e}")
+                return False
+            sleep = self.backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+            time.sleep(max(min(sleep, end - time.monotonic()), 0))
+        print(f"Error: Motor command {key} to {self.url} gave up after its {deadline or self.deadline:.1f}s deadline.")
+        return False
+
+    def submit(self, timer, deadline=None):
+        # Queue send() on the worker thread and return a concurrent.futures.Future
+        return self._executor.submit(self.send, timer, deadline)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # Local stand-in for the feeder device: accepts POST /feed {'timer': ms}, ignoring repeated Idempotency-Keys
+    seen = set()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        key = self.headers.get('Idempotency-Key')
+        duplicate = key in self.seen
+        self.seen.add(key)
+        if self.path != '/feed' or 'timer' not in body:
+            self.send_response(400)
+        else:
+            self.send_response(200)
+            print(f"{'duplicate' if duplicate else 'feed'} timer={body['timer']} key={key}")
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--serve', action='store_true', help='run a local stand-in /feed device')
+    parser.add_argument('--host', default='127.0.0.1', help='stand-in host')
+    parser.add_argument('--port', type=int, default=8000, help='stand-in port')
+    parser.add_argument('--url', default=MOTOR_URL, help='send one command to this /feed URL')
+    parser.add_argument('--timer', type=int, default=1000, help='motor runtime in ms')
+    return parser.parse_args()
+
+
+def main(opt):
+    if opt.serve:
+        ThreadingHTTPServer((opt.host, opt.port), StandInHandler).serve_forever()
+    else:
+        MotorClient(opt.url).send(opt.timer)
+
+
+if __name__ == '__main__':
+    opt = parse_opt()
+    main(opt)
@@ -0,0 +1,16 @@
+# gunicorn.conf.py
+# Production server settings for web_server.py, i.e. `gunicorn -c gunicorn.conf.py web_server:app`
+# Socket.IO needs sticky sessions, so run one async worker per process (scale out behind a sticky load balancer)
+import os
+
+bind = os.getenv('BIND', f"0.0.0.0:{os.getenv('PORT', 5000)}")
+worker_class = os.getenv('WORKER_CLASS', 'eventlet')  # eventlet | gevent | gthread
+workers = int(os.getenv('WORKERS', 1))
+threads = int(os.getenv('THREADS', 8))  # used by the gthread worker only
+worker_connections = int(os.getenv('WORKER_CONNECTIONS', 1000))  # concurrent clients per eventlet/gevent worker
+timeout = int(os.getenv('TIMEOUT', 60))
+keepalive = int(os.getenv('KEEPALIVE', 5))
+loglevel = os.getenv('LOG_LEVEL', 'info').lower()
+accesslog = os.getenv('ACCESS_LOG') or None  # i.e. ACCESS_LOG=- for stdout, disabled by default
+errorlog = '-'
+raw_env = [f"SOCKETIO_ASYNC_MODE={os.getenv('SOCKETIO_ASYNC_MODE', worker_class if worker_class != 'gthread' else 'threading')}"]
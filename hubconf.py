@@ -8,12 +8,13 @@ Usage:
     model = torch.hub.load('ultralytics/yolov5:master', 'yolov5s')  # from branch
     model = torch.hub.load('ultralytics/yolov5', 'custom', 'yolov5s.pt')  # custom/local model
     model = torch.hub.load('.', 'custom', 'yolov5s.pt', source='local')  # local repo
+    model = torch.hub.load('.', 'custom', 'pets', source='local', half=True)  # registered model, offline
 """
 
 import torch
 
 
-def _create(name, pretrained=True, channels=3, classes=80, autoshape=True, verbose=True, device=None):
+def _create(name, pretrained=True, channels=3, classes=80, autoshape=True, verbose=True, device=None, half=False):
     """Creates or loads a YOLOv5 model
 
     Arguments:
@@ -24,6 +25,7 @@ def _create(name, pretrained=True, channels=3, classes=80, autoshape=True, verbo
         autoshape (bool): apply YOLOv5 .autoshape() wrapper to model
         verbose (bool): print all information to screen
         device (str, torch.device, None): device to use for model parameters
+        half (bool): use FP16 half-precision inference on CUDA devices
 
     Returns:
         YOLOv5 model
@@ -32,8 +34,8 @@ def _create(name, pretrained=True, channels=3, classes=80, autoshape=True, verbo
 
     from models.common import AutoShape, DetectMultiBackend
     from models.experimental import attempt_load
+    from models.registry import REGISTRY, artifact, resolve
     from models.yolo import ClassificationModel, DetectionModel, SegmentationModel
-    from utils.downloads import attempt_download
     from utils.general import LOGGER, check_requirements, intersect_dicts, logging
     from utils.torch_utils import select_device
 
@@ -41,12 +43,18 @@ def _create(name, pretrained=True, channels=3, classes=80, autoshape=True, verbo
         LOGGER.setLevel(logging.WARNING)
     check_requirements(exclude=('opencv-python', 'tensorboard', 'thop'))
     name = Path(name)
-    path = name.with_suffix('.pt') if name.suffix == '' and not name.is_dir() else name  # checkpoint path
+    weights = name.with_suffix('.pt') if name.suffix == '' and not name.is_dir() else name  # checkpoint path
     try:
         device = select_device(device)
+        half &= device.type != 'cpu'  # FP16 supported on CUDA only
         if pretrained and channels == 3 and classes == 80:
+            path = weights
+            if path.suffix == '.pt':
+                # registry: hashed weights, cached fused FP32 model. FP16 is applied after loading because
+                # attempt_load() casts every checkpoint to FP32, so an FP16 artifact would save nothing
+                path = artifact(path, fuse=autoshape)
             try:
-                model = DetectMultiBackend(path, device=device, fuse=autoshape)  # detection model
+                model = DetectMultiBackend(path, device=device, fuse=autoshape, fp16=half)  # detection model
                 if autoshape:
                     if model.pt and isinstance(model.model, ClassificationModel):
                         LOGGER.warning('WARNING ⚠️ YOLOv5 ClassificationModel is not yet AutoShape compatible. '
@@ -57,12 +65,15 @@ def _create(name, pretrained=True, channels=3, classes=80, autoshape=True, verbo
                     else:
                         model = AutoShape(model)  # for file/URI/PIL/cv2/np inputs and NMS
             except Exception:
-                model = attempt_load(path, device=device, fuse=False)  # arbitrary model
+                if weights.suffix == '.pt':
+                    weights = REGISTRY / resolve(weights)['weights']  # original weights, not the fused artifact
+                model = attempt_load(weights, device=device, fuse=False)  # arbitrary model, FP32
+                model = model.half() if half else model
         else:
-            cfg = list((Path(__file__).parent / 'models').rglob(f'{path.stem}.yaml'))[0]  # model.yaml path
+            cfg = list((Path(__file__).parent / 'models').rglob(f'{weights.stem}.yaml'))[0]  # model.yaml path
             model = DetectionModel(cfg, channels, classes)  # create model
             if pretrained:
-                ckpt = torch.load(attempt_download(path), map_location=device)  # load
+                ckpt = torch.load(REGISTRY / resolve(weights)['weights'], map_location=device)  # load
                 csd = ckpt['model'].float().state_dict()  # checkpoint state_dict as FP32
                 csd = intersect_dicts(csd, model.state_dict(), exclude=['anchors'])  # intersect
                 model.load_state_dict(csd, strict=False)  # load
@@ -78,9 +89,9 @@ def _create(name, pretrained=True, channels=3, classes=80, autoshape=True, verbo
         raise Exception(s) from e
 
 
-def custom(path='path/to/model.pt', autoshape=True, _verbose=True, device=None):
-    # YOLOv5 custom or local model
-    return _create(path, autoshape=autoshape, verbose=_verbose, device=device)
+def custom(path='path/to/model.pt', autoshape=True, _verbose=True, device=None, half=False):
+    # YOLOv5 custom or local model, or a name registered with models/registry.py
+    return _create(path, autoshape=autoshape, verbose=_verbose, device=device, half=half)
 
 
 def yolov5n(pretrained=True, channels=3, classes=80, autoshape=True, _verbose=True, device=None):
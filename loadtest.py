@@ -0,0 +1,140 @@
+# loadtest.py
+"""
+Load test for web_server.py: requests/s and latency percentiles for the main routes
+
+Usage - self-contained, against a seeded SQLite stand-in served in-process:
+    $ python loadtest.py --sqlite --seconds 10 --concurrency 16
+
+Usage - against a running server (i.e. gunicorn -c gunicorn.conf.py web_server:app on local MySQL):
+    $ python loadtest.py --url http://127.0.0.1:5000 --seconds 10 --concurrency 16
+"""
+
+import argparse
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import requests
+
+ROUTES = (  # (method, path, form data)
+    ('GET', '/temperature', None),
+    ('GET', '/weight', None),
+    ('GET', '/dashboard', None),
+    ('GET', '/sensor_series', None),
+    ('GET', '/getFeedHistory?limit=100', None),
+    ('POST', '/save_sensor_data', {'temperature': '24.5', 'humidity': '41.0', 'weight': '0.12'}),
+)
+
+
+def seed_sqlite(path, sensor_rows=200000, detection_rows=50000):
+    # Create the tables web_server.py uses and fill them with synthetic history
+    from sqlalchemy import create_engine, text
+    engine = create_engine(f'sqlite:///{path}')
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE sensor_data (id INTEGER PRIMARY KEY, temperature FLOAT, humidity FLOAT, "
+                          "weight FLOAT, timestamp DATETIME)"))
+        conn.execute(text("CREATE TABLE detection_log (id INTEGER PRIMARY KEY, breed VARCHAR(64), time DATETIME, "
+                          "FeedAmount INT)"))
+        conn.execute(text("CREATE TABLE petbreed (BreedName VARCHAR(64) PRIMARY KEY, DefaultFeedAmount INT)"))
+        conn.execute(text("INSERT INTO petbreed VALUES ('Beagle', 50), ('Pug', 30)"))
+        step = timedelta(days=30) / sensor_rows
+        conn.execute(text("INSERT INTO sensor_data (temperature, humidity, weight, timestamp) VALUES (:t, :h, :w, :ts)"),
+                     [{'t': 20 + random.random() * 5, 'h': 40 + random.random() * 10, 'w': random.random(),
+                       'ts': now - step * i} for i in range(sensor_rows)])
+        step = timedelta(days=90) / detection_rows
+        conn.execute(text("INSERT INTO detection_log (breed, time, FeedAmount) VALUES (:b, :t, :a)"),
+                     [{'b': random.choice(('Beagle', 'Pug')), 't': now - step * i, 'a': 50}
+                      for i in range(detection_rows)])
+    engine.dispose()
+
+
+def serve_in_process(path, port):
+    # Import web_server against the SQLite stand-in and serve it from a background thread
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    from werkzeug.serving import make_server
+
+    import web_server
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # no per-request access log
+    server = make_server('127.0.0.1', port, web_server.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{port}', server
+
+
+def percentile(x, p):
+    x = sorted(x)
+    return x[min(int(len(x) * p / 100), len(x) - 1)] if x else float('nan')
+
+
+def run(url, seconds=10.0, concurrency=16, routes=ROUTES):
+    # Hit every route from `concurrency` keep-alive clients for `seconds` each, print requests/s and p50/p99
+    results = {}
+    for method, path, data in routes:
+        latencies, errors, stop = [], [0], threading.Event()
+        lock = threading.Lock()
+
+        def client():
+            session = requests.Session()
+            while not stop.is_set():
+                t = time.perf_counter()
+                try:
+                    r = session.request(method, url + path, data=data, timeout=30)
+                    ok = r.status_code < 400
+                except requests.RequestException:
+                    ok = False
+                dt = time.perf_counter() - t
+                with lock:
+                    latencies.append(dt)
+                    errors[0] += not ok
+
+        threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+        t0 = time.perf_counter()
+        for x in threads:
+            x.start()
+        time.sleep(seconds)
+        stop.set()
+        for x in threads:
+            x.join()
+        elapsed = time.perf_counter() - t0
+        results[path] = {
+            'requests': len(latencies),
+            'errors': errors[0],
+            'rps': len(latencies) / elapsed,
+            'p50_ms': percentile(latencies, 50) * 1E3,
+            'p99_ms': percentile(latencies, 99) * 1E3}
+
+    print(f"{'route':<32}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for path, r in results.items():
+        print(f"{path:<32}{r['requests']:>10}{r['errors']:>8}{r['rps']:>10.1f}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}")
+    return results
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='running server base URL')
+    parser.add_argument('--sqlite', action='store_true', help='seed an SQLite stand-in and serve it in-process')
+    parser.add_argument('--port', type=int, default=5055, help='in-process server port with --sqlite')
+    parser.add_argument('--sensor-rows', type=int, default=200000, help='seeded sensor_data rows with --sqlite')
+    parser.add_argument('--detection-rows', type=int, default=50000, help='seeded detection_log rows with --sqlite')
+    parser.add_argument('--seconds', type=float, default=10.0, help='duration per route')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent clients')
+    return parser.parse_args()
+
+
+def main(opt):
+    url = opt.url
+    if opt.sqlite:
+        path = os.path.join(tempfile.mkdtemp(), 'feeder.db')
+        seed_sqlite(path, opt.sensor_rows, opt.detection_rows)
+        url, _ = serve_in_process(path, opt.port)
+    run(url, opt.seconds, opt.concurrency)
+
+
+if __name__ == '__main__':
+    opt = parse_opt()
+    main(opt)
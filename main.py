@@ -1,9 +1,253 @@
-import subprocess
+# main.py
+"""
+Smart feeder supervisor: runs the web server, detector and feeding decision engine in one process
 
-# 두 스크립트를 병렬로 실행하기 위해 Popen 객체를 생성합니다.
-process1 = subprocess.Popen(["python", "web_server.py"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-process2 = subprocess.Popen(["python", "Smart_feeder.py"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+Usage:
+    $ python main.py                       # web server + detector + feeder
+    $ python main.py --no-detector         # web server only
+    $ curl http://localhost:5000/health    # worker health
 
-# 두 프로세스가 종료될 때까지 기다립니다.
-process1.wait()
-process2.wait()
+The detector publishes DetectionEvent tuples on the 'detection' topic of an in-process EventBus and the feeder worker
+consumes them, so the settings cache, CooldownTracker, LogWriter and MotorClient are shared instead of duplicated.
+"""
+
+import argparse
+import logging
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+
+LOGGER = logging.getLogger('feeder')
+
+
+class EventBus:
+    # In-process publish/subscribe with bounded per-subscriber queues; full queues drop the oldest event
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._subscribers = {}  # topic: [queue.Queue]
+        self._lock = threading.Lock()
+        self.published, self.dropped = {}, {}  # topic: count
+
+    def subscribe(self, topic):
+        q = queue.Queue(maxsize=self.maxsize)
+        with self._lock:
+            self._subscribers.setdefault(topic, []).append(q)
+        return q
+
+    def publish(self, topic, payload):
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+            self.published[topic] = self.published.get(topic, 0) + 1
+        for q in subscribers:
+            while True:
+                try:
+                    q.put_nowait(payload)
+                    break
+                except queue.Full:
+                    try:
+                        q.get_nowait()  # slow consumer: keep the newest events
+                        with self._lock:
+                            self.dropped[topic] = self.dropped.get(topic, 0) + 1
+                    except queue.Empty:
+                        pass
+
+
+class Worker:
+    # Supervised thread running target(worker), restarted according to restart policy
+    # restart: 'always' | 'on-failure' | 'never'
+    def __init__(self, name, target, restart='on-failure', max_restarts=5, backoff=2.0, heartbeat_timeout=None):
+        self.name = name
+        self.target = target
+        self.restart = restart
+        self.max_restarts = max_restarts
+        self.backoff = backoff  # seconds, doubled per consecutive restart
+        self.heartbeat_timeout = heartbeat_timeout  # seconds without beat() before the worker is reported unhealthy
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.restarts = 0
+        self.started = self.last_beat = 0.0
+        self.error = None
+        self.exited = False
+        self.next_start = 0.0
+
+    def beat(self):
+        # Called by target() to report progress
+        self.last_beat = time.time()
+
+    def _run(self):
+        self.error, self.exited = None, False
+        try:
+            self.target(self)
+        except Exception as e:
+            self.error = repr(e)
+            LOGGER.exception(f'{self.name} worker failed')
+        finally:
+            self.exited = True
+
+    def start(self):
+        self.started = self.last_beat = time.time()
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def alive(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def healthy(self):
+        if not self.alive():
+            return False
+        return self.heartbeat_timeout is None or time.time() - self.last_beat < self.heartbeat_timeout
+
+    def should_restart(self):
+        if self.stop_event.is_set() or self.restarts >= self.max_restarts:
+            return False
+        return self.restart == 'always' or (self.restart == 'on-failure' and self.error is not None)
+
+    def status(self):
+        return {
+            'alive': self.alive(),
+            'healthy': self.healthy(),
+            'restarts': self.restarts,
+            'uptime': round(time.time() - self.started, 1) if self.alive() else 0,
+            'last_beat': round(time.time() - self.last_beat, 1),
+            'error': self.error}
+
+
+class Supervisor:
+    # Starts workers, restarts them per policy and reports their health
+    def __init__(self, bus=None, interval=1.0):
+        self.bus = bus or EventBus()
+        self.interval = interval
+        self.workers = {}
+        self._stop = threading.Event()
+
+    def add(self, worker):
+        self.workers[worker.name] = worker
+        return worker
+
+    def status(self):
+        return {
+            'workers': {k: w.status() for k, w in self.workers.items()},
+            'published': dict(self.bus.published),
+            'dropped': dict(self.bus.dropped)}
+
+    def run(self):
+        for w in self.workers.values():
+            LOGGER.info(f'starting {w.name}')
+            w.start()
+        while not self._stop.wait(self.interval):
+            now = time.time()
+            for w in self.workers.values():
+                if w.alive():
+                    if not w.healthy():
+                        LOGGER.warning(f'{w.name} missed heartbeat for {now - w.last_beat:.0f}s')
+                    continue
+                if not w.should_restart():
+                    continue
+                if not w.next_start:
+                    w.next_start = now + w.backoff * 2 ** w.restarts
+                    LOGGER.warning(f'{w.name} exited ({w.error}), restarting in {w.next_start - now:.1f}s')
+                elif now >= w.next_start:
+                    w.restarts += 1
+                    w.next_start = 0.0
+                    w.start()
+            if self.workers and not any(w.alive() or w.should_restart() for w in self.workers.values()):
+                LOGGER.info('all workers exited')
+                break
+        self.stop()
+
+    def stop(self):
+        self._stop.set()
+        for w in self.workers.values():
+            w.stop_event.set()
+
+
+def web_worker(supervisor, host, port):
+    # Flask/Socket.IO server, with supervisor health at /health
+    def target(worker):
+        from flask import jsonify
+
+        # Served from a worker thread next to real threads blocked on the detector: eventlet/gevent would need the
+        # main thread and monkey-patching, so always use threading mode here
+        os.environ['SOCKETIO_ASYNC_MODE'] = 'threading'
+        from web_server import app, socketio
+        if 'health' not in app.view_functions:
+            app.add_url_rule('/health', 'health', lambda: jsonify(supervisor.status()))
+        socketio.run(app, host=host, port=port, debug=False, use_reloader=False,
+                     allow_unsafe_werkzeug=socketio.async_mode == 'threading')
+
+    return Worker('web', target, restart='always')  # blocks in socketio.run(), so liveness is the thread itself
+
+
+def detector_worker(bus):
+    # FeederDetector publishing DetectionEvent tuples on the 'detection' topic
+    def target(worker):
+        import Smart_feeder
+        detector = Smart_feeder.create_detector()
+        worker.beat()
+        for event in detector:
+            worker.beat()
+            bus.publish('detection', event)
+            if worker.stop_event.is_set():
+                detector.stop()
+
+    return Worker('detector', target, restart='always')  # events only arrive on detections, so no heartbeat timeout
+
+
+def feeder_worker(bus, user_id=1):
+    # Feeding decision engine consuming the 'detection' topic
+    events = bus.subscribe('detection')
+
+    def target(worker):
+        import Smart_feeder
+        while not worker.stop_event.is_set():
+            worker.beat()
+            try:
+                event = events.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            LOGGER.info(f'Detected breed: {event.breed} ({event.conf:.2f})')
+            if Smart_feeder.handle_detection(event.breed, user_id=user_id):
+                bus.publish('feeding', event)
+
+    return Worker('feeder', target, restart='always', heartbeat_timeout=10)
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='0.0.0.0', help='web server host')
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', 5000)), help='web server port')
+    parser.add_argument('--user-id', type=int, default=1, help='feeder user id')
+    parser.add_argument('--no-web', action='store_true', help='do not run the web server')
+    parser.add_argument('--no-detector', action='store_true', help='do not run the detector and feeder')
+    parser.add_argument('--log-level', default=os.getenv('LOG_LEVEL', 'INFO'), help='logging level')
+    return parser.parse_args()
+
+
+def main(opt):
+    logging.basicConfig(level=opt.log_level.upper(), format='%(asctime)s %(threadName)s %(levelname)s %(message)s')
+    supervisor = Supervisor()
+    if not opt.no_web:
+        supervisor.add(web_worker(supervisor, opt.host, opt.port))
+    if not opt.no_detector:
+        import Smart_feeder
+        Smart_feeder.start()
+        supervisor.add(detector_worker(supervisor.bus))
+        supervisor.add(feeder_worker(supervisor.bus, opt.user_id))
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: supervisor.stop())
+    try:
+        supervisor.run()
+    finally:
+        if not opt.no_detector:
+            Smart_feeder.shutdown()  # flush cooldowns and queued log rows
+        if 'web_server' in sys.modules:
+            sys.modules['web_server'].sensor_ingestor.stop()  # write buffered sensor readings
+
+
+if __name__ == '__main__':
+    opt = parse_opt()
+    main(opt)
@@ -25,7 +25,7 @@ from PIL import Image
 from torch.cuda import amp
 
 from utils import TryExcept
-from utils.dataloaders import exif_transpose, letterbox
+from utils.dataloaders import exif_transpose, letterbox_chw
 from utils.general import (LOGGER, ROOT, Profile, check_requirements, check_suffix, check_version, colorstr,
                            increment_path, is_jupyter, make_divisible, non_max_suppression, scale_boxes, xywh2xyxy,
                            xyxy2xywh, yaml_load)
@@ -695,9 +695,13 @@ class AutoShape(nn.Module):
                 shape1.append([int(y * g) for y in s])
                 ims[i] = im if im.data.contiguous else np.ascontiguousarray(im)  # update
             shape1 = [make_divisible(x, self.stride) for x in np.array(shape1).max(0)]  # inf shape
-            x = [letterbox(im, shape1, auto=False)[0] for im in ims]  # pad
-            x = np.ascontiguousarray(np.array(x).transpose((0, 3, 1, 2)))  # stack and BHWC to BCHW
-            x = torch.from_numpy(x).to(p.device).type_as(p) / 255  # uint8 to fp16/32
+            uint8 = all(im.dtype == np.uint8 for im in ims)  # uint8 fast path, i.e. not float np.zeros((640, 1280, 3))
+            norm = not uint8 or (p.device.type == 'cpu' and p.dtype == torch.float32)  # normalize on host to float32
+            x = np.empty((n, 3, *shape1), np.float32 if norm else np.uint8)
+            for im, y in zip(ims, x):
+                letterbox_chw(im, shape1, auto=False, bgr=False, normalize=norm, out=y)  # pad, HWC to CHW into batch
+            x = torch.from_numpy(x).to(p.device).type_as(p)  # no-op for host-normalized float32 on CPU
+            x = x if norm else x / 255  # uint8 to fp16/32
 
         with amp.autocast(autocast):
             # Inference
@@ -813,6 +817,59 @@ class Detections:
             setattr(new, k, [pd.DataFrame(x, columns=c) for x in a])
         return new
 
+    def numpy(self, fmt='xyxy'):
+        # return detections as columnar NumPy arrays per image, i.e. results.numpy()[0]['boxes'], no pandas
+        return [self._columns(x) for x in getattr(self, fmt)]
+
+    @staticmethod
+    def _columns(x):
+        a = x.detach().cpu().double().numpy()  # one device-to-host copy per image, FP64 for exact JSON rounding
+        return {'boxes': a[:, :4], 'scores': a[:, 4], 'classes': a[:, 5].astype(np.int32)}
+
+    @staticmethod
+    def columns(a, names, decimals=2):
+        # numpy() columns as {'boxes': [[x, y, x, y], ...], 'scores', 'classes', 'names'} of lists, JSON/msgpack ready.
+        # names keys are strings since JSON objects and msgpack.unpackb() (strict_map_key=True) reject int keys
+        return {
+            'boxes': a['boxes'].round(decimals).tolist(),
+            'scores': a['scores'].round(4).tolist(),
+            'classes': a['classes'].tolist(),
+            'names': {str(c): names[int(c)] for c in np.unique(a['classes'])}}
+
+    def to_json(self, i=0, fmt='xyxy', decimals=2):
+        # return image i detections as columnar JSON: {"boxes": [[x, y, x, y], ...], "scores", "classes", "names"}
+        a = self._columns(getattr(self, fmt)[i])
+        return json.dumps(self.columns(a, self.names, decimals), separators=(',', ':'))
+
+    def to_msgpack(self, i=0, fmt='xyxy'):
+        # return image i detections as msgpack with little-endian binary columns, read with np.frombuffer(b, '<f4')
+        check_requirements('msgpack')
+        import msgpack
+
+        a = self._columns(getattr(self, fmt)[i])
+        return msgpack.packb({
+            'n': len(a['scores']),
+            'boxes': a['boxes'].astype('<f4').tobytes(),  # (n, 4)
+            'scores': a['scores'].astype('<f4').tobytes(),
+            'classes': a['classes'].astype('<i2').tobytes(),
+            'names': {str(c): self.names[int(c)] for c in np.unique(a['classes'])}})  # str keys, see columns()
+
+    def arrow(self, fmt='xyxy'):
+        # return detections of all images as one pyarrow.Table with an 'image' index column
+        check_requirements('pyarrow')
+        import pyarrow as pa
+
+        cols = self.numpy(fmt)
+        boxes = np.concatenate([a['boxes'] for a in cols]) if cols else np.zeros((0, 4), np.float32)
+        classes = np.concatenate([a['classes'] for a in cols]) if cols else np.zeros(0, np.int32)
+        keys = ('xmin', 'ymin', 'xmax', 'ymax') if fmt.startswith('xyxy') else ('xcenter', 'ycenter', 'width', 'height')
+        return pa.table({
+            'image': np.repeat(np.arange(len(cols), dtype=np.int32), [len(a['scores']) for a in cols]),
+            **{k: np.ascontiguousarray(boxes[:, j]) for j, k in enumerate(keys)},
+            'confidence': np.concatenate([a['scores'] for a in cols]) if cols else np.zeros(0, np.float32),
+            'class': classes,
+            'name': pa.array([self.names[int(c)] for c in classes], pa.string())})
+
     def tolist(self):
         # return a list of Detections objects, i.e. 'for result in results.tolist():'
         r = range(self.n)  # iterable
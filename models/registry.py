@@ -0,0 +1,124 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""
+Local model registry: content-hashed weights and cached fused model artifacts for offline loading
+
+Usage:
+    $ python models/registry.py --register path/to/best.pt --name pets   # add weights under a name
+    $ python models/registry.py --register yolov5s                       # download once, then offline
+    $ python models/registry.py --list
+
+    from models.registry import artifact
+    path = artifact('pets')  # fused checkpoint loadable by DetectMultiBackend/attempt_load
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import torch
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[1]  # YOLOv5 root directory
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))  # add ROOT to PATH
+
+from utils.general import LOGGER
+
+REGISTRY = Path(os.getenv('YOLOV5_REGISTRY', ROOT / 'runs' / 'registry'))  # registry directory
+INDEX = 'index.json'  # name: {'sha256', 'weights', 'source'}
+
+
+def file_hash(path, chunk=1 << 20):
+    # SHA-256 hex digest of a file
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for b in iter(lambda: f.read(chunk), b''):
+            h.update(b)
+    return h.hexdigest()
+
+
+def _save_atomic(save, path):
+    # Write through a temporary file and rename, so readers never see partial files
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    save(tmp)
+    os.replace(tmp, path)
+
+
+def load_index(registry=REGISTRY):
+    f = Path(registry) / INDEX
+    return json.loads(f.read_text()) if f.exists() else {}
+
+
+def register(weights, name=None, registry=REGISTRY):
+    # Copy weights into the registry under their content hash and index them by name, downloading only if not local
+    from utils.downloads import attempt_download
+
+    registry = Path(registry)
+    weights = Path(attempt_download(weights))
+    sha = file_hash(weights)
+    dst = registry / 'weights' / f'{sha[:16]}.pt'
+    if not dst.exists():
+        _save_atomic(lambda f: shutil.copyfile(weights, f), dst)
+    index = load_index(registry)
+    index[name or weights.stem] = {'sha256': sha, 'weights': str(dst.relative_to(registry)), 'source': str(weights)}
+    _save_atomic(lambda f: Path(f).write_text(json.dumps(index, indent=2)), registry / INDEX)
+    LOGGER.info(f'Registered {weights} as {name or weights.stem} ({sha[:16]})')
+    return index[name or weights.stem]
+
+
+def resolve(weights, registry=REGISTRY):
+    # Registry entry for a name, i.e. 'yolov5s' or 'yolov5s.pt', or for a local weights file; registers if needed
+    registry = Path(registry)
+    name = Path(weights).stem
+    index = load_index(registry)
+    if Path(weights).is_file():  # local file: register under its stem unless already registered with the same hash
+        sha = file_hash(weights)
+        entry = index.get(name)
+        return entry if entry and entry['sha256'] == sha and (registry / entry['weights']).exists() else \
+            register(weights, name, registry)
+    if name in index and (registry / index[name]['weights']).exists():
+        return index[name]
+    return register(Path(weights).with_suffix('.pt'), name, registry)  # not registered: one-time download
+
+
+def artifact(weights, fuse=True, half=False, registry=REGISTRY):
+    # Path to a cached checkpoint holding the (fused, FP16) model for these weights, built on first use.
+    # Note attempt_load() casts checkpoints to FP32, so half=True only halves the file; call .half() after loading
+    registry = Path(registry)
+    entry = resolve(weights, registry)
+    f = registry / 'artifacts' / f"{entry['sha256'][:16]}{'-fused' if fuse else ''}{'-fp16' if half else ''}.pt"
+    if not f.exists():
+        from models.experimental import attempt_load
+        model = attempt_load(registry / entry['weights'], device='cpu', fuse=fuse)
+        model = model.half() if half else model
+        ckpt = {'model': model, 'sha256': entry['sha256'], 'source': entry['source']}
+        _save_atomic(lambda x: torch.save(ckpt, x), f)
+        LOGGER.info(f'Cached {weights} model artifact {f}')
+    return f
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--register', type=str, help='weights path or name to add, i.e. path/to/best.pt or yolov5s')
+    parser.add_argument('--name', type=str, help='registry name, default weights stem')
+    parser.add_argument('--list', action='store_true', help='list registered models')
+    parser.add_argument('--registry', type=str, default=str(REGISTRY), help='registry directory')
+    return parser.parse_args()
+
+
+def main(opt):
+    if opt.register:
+        register(opt.register, opt.name, opt.registry)
+    if opt.list or not opt.register:
+        for name, entry in load_index(opt.registry).items():
+            print(f"{name:<20}{entry['sha256'][:16]}  {entry['source']}")
+
+
+if __name__ == '__main__':
+    opt = parse_opt()
+    main(opt)
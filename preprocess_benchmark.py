@@ -0,0 +1,76 @@
+# YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
+"""
+Validate and benchmark fused letterbox_chw() preprocessing against letterbox() + transpose + BGR to RGB + / 255
+
+Usage:
+    $ python preprocess_benchmark.py                                  # 480p, 720p and 1080p frames at 640
+    $ python preprocess_benchmark.py --shapes 1080 1920 --imgsz 1280 --iters 200
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+FILE = Path(__file__).resolve()
+ROOT = FILE.parents[0]  # YOLOv5 root directory
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))  # add ROOT to PATH
+
+from utils.augmentations import letterbox, letterbox_chw
+
+
+def unfused(im, imgsz, auto, normalize):
+    # Current path: padded resize, transpose, negative-stride BGR to RGB copy, then uint8 to float32 / 255
+    im = np.ascontiguousarray(letterbox(im, imgsz, auto=auto)[0].transpose((2, 0, 1))[::-1])
+    return im.astype(np.float32) / np.float32(255) if normalize else im
+
+
+def timeit(fn, iters, repeat=5):
+    fn()  # warmup
+    ts = []
+    for _ in range(repeat):  # best of repeats, robust to other load on the machine
+        t = time.perf_counter()
+        for _ in range(max(iters // repeat, 1)):
+            fn()
+        ts.append((time.perf_counter() - t) / max(iters // repeat, 1))
+    return min(ts) * 1E3  # ms per call
+
+
+def run(shapes=((480, 640), (720, 1280), (1080, 1920)), imgsz=640, auto=True, iters=100):
+    rng = np.random.default_rng(0)
+    rows = []
+    for shape in shapes:
+        im = rng.integers(0, 256, (*shape, 3), np.uint8)  # BGR frame
+        for normalize in False, True:
+            a, b = unfused(im, imgsz, auto, normalize), letterbox_chw(im, imgsz, auto=auto, normalize=normalize)[0]
+            assert a.dtype == b.dtype and a.shape == b.shape and a.tobytes() == b.tobytes(), f'mismatch at {shape}'
+            out = np.empty_like(b)  # reused output buffer
+            t0 = timeit(lambda: unfused(im, imgsz, auto, normalize), iters)
+            t1 = timeit(lambda: letterbox_chw(im, imgsz, auto=auto, normalize=normalize, out=out), iters)
+            rows.append((shape, 'float32' if normalize else 'uint8', t0, t1))
+
+    print(f"{'source':>12}{'output':>10}{'unfused ms':>12}{'fused ms':>10}{'speedup':>9}   (bit-identical)")
+    for (h, w), dtype, t0, t1 in rows:
+        print(f'{f"{w}x{h}":>12}{dtype:>10}{t0:>12.2f}{t1:>10.2f}{t0 / t1:>8.2f}x')
+    return rows
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shapes', type=int, nargs='+', default=[480, 640, 720, 1280, 1080, 1920], help='h w pairs')
+    parser.add_argument('--imgsz', type=int, default=640, help='inference size')
+    parser.add_argument('--no-auto', action='store_true', help='pad to the full square, not minimum rectangle')
+    parser.add_argument('--iters', type=int, default=100, help='timed iterations per path')
+    return parser.parse_args()
+
+
+def main(opt):
+    run(list(zip(opt.shapes[::2], opt.shapes[1::2])), opt.imgsz, not opt.no_auto, opt.iters)
+
+
+if __name__ == '__main__':
+    opt = parse_opt()
+    main(opt)
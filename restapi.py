@@ -1,48 +1,326 @@
 # YOLOv5 🚀 by Ultralytics, AGPL-3.0 license
 """
 Run a Flask REST API exposing one or more YOLOv5s models
+
+Requests are queued per model and run as dynamic micro-batches: the first queued image opens a batch that closes after
+--max-wait-ms or --max-batch images, whichever comes first, so throughput scales with batch size, not request count.
+
+Usage:
+    $ python restapi.py --model yolov5n yolov5s --max-batch 8 --max-wait-ms 10
+    $ python restapi.py --model pets --device 0 --half  # registered with models/registry.py, loads offline
+    $ curl -F image=@zidane.jpg http://localhost:5000/v1/object-detection/yolov5s
+    $ curl -F image=@zidane.jpg -H 'Accept: application/msgpack' http://localhost:5000/v1/object-detection/yolov5s
+    $ curl -F image=@zidane.jpg http://localhost:5000/v1/object-detection/yolov5s?layout=columns  # columnar boxes
+    $ curl http://localhost:5000/v1/metrics
+
+Usage - streams, one result line per frame as NDJSON (default) or SSE (Accept: text/event-stream or ?format=sse):
+    $ curl -F video=@clip.mp4 http://localhost:5000/v1/object-detection/yolov5s/stream?stride=5
+    $ curl -T cam.mjpeg -H 'Content-Type: multipart/x-mixed-replace' localhost:5000/v1/object-detection/yolov5s/stream
+    $ cat *.jpg | curl -T - http://localhost:5000/v1/object-detection/yolov5s/stream   # chunked JPEG stream
 """
 
 import argparse
 import io
+import json
+import queue
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from pathlib import Path
 
+import cv2
+import numpy as np
 import torch
-from flask import Flask, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from PIL import Image
 
+from models.common import Detections
+from utils.dataloaders import exif_transpose
+
+try:
+    import msgpack  # optional binary response format
+except ImportError:
+    msgpack = None
+
+ROOT = Path(__file__).resolve().parent  # YOLOv5 root directory
 app = Flask(__name__)
-models = {}
+models = {}  # name: BatchedModel
 
 DETECTION_URL = '/v1/object-detection/<model>'
+STREAM_URL = '/v1/object-detection/<model>/stream'
+METRICS_URL = '/v1/metrics'
+REQUEST_TIMEOUT = 30  # seconds a request waits for its batch before 503
+
+
+class BatchedModel:
+    # Per-model request queue served by one thread that runs AutoShape once per dynamic micro-batch
+    def __init__(self, name, model, size=640, max_batch=8, max_wait=0.01, maxsize=256):
+        self.name = name
+        self.model = model  # AutoShape
+        self.size = size  # inference size (pixels)
+        self.max_batch = max_batch  # images per forward pass
+        self.max_wait = max_wait  # seconds the oldest queued image waits for a batch to fill
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.lock = threading.Lock()
+        self.requests = self.batches = self.rejected = self.errors = 0
+        self.timings = deque(maxlen=1000)  # (queue, inference, total) seconds of recent requests
+        self.thread = threading.Thread(target=self._run, name=f'batch-{name}', daemon=True)
+        self.thread.start()
+
+    def submit(self, im):
+        # Queue one HWC RGB image, returns a Future resolving to (columns dict, timings dict). Raises queue.Full
+        future = Future()
+        try:
+            self.queue.put_nowait((im, future, time.perf_counter()))
+        except queue.Full:
+            with self.lock:
+                self.rejected += 1
+            raise
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = batch[0][2] + self.max_wait  # latency budget starts when the oldest request arrived
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get(timeout=max(deadline - time.perf_counter(), 0)))
+                except queue.Empty:
+                    break
+            self._infer(batch)
+
+    def _infer(self, batch):
+        t0 = time.perf_counter()
+        try:
+            results = self.model([im for im, _, _ in batch], size=self.size)
+            detections = results.numpy()  # columnar arrays per image, serialized on the request threads
+        except Exception as e:
+            with self.lock:
+                self.errors += len(batch)
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        t1 = time.perf_counter()
+        with self.lock:
+            self.requests += len(batch)
+            self.batches += 1
+            for i, (_, future, t) in enumerate(batch):
+                timings = {'queue': t0 - t, 'inference': t1 - t0, 'total': t1 - t, 'batch': len(batch)}
+                self.timings.append((timings['queue'], timings['inference'], timings['total']))
+                future.set_result((detections[i], timings))
+
+    def metrics(self):
+        with self.lock:
+            t = np.array(self.timings).reshape(-1, 3) * 1E3  # ms
+            m = {
+                'requests': self.requests,
+                'batches': self.batches,
+                'mean_batch': round(self.requests / self.batches, 2) if self.batches else 0,
+                'queue_depth': self.queue.qsize(),
+                'rejected': self.rejected,
+                'errors': self.errors}
+        for i, k in enumerate(('queue', 'inference', 'total')):
+            p50, p99 = np.percentile(t[:, i], (50, 99)) if len(t) else (0, 0)
+            m[f'{k}_ms'] = {'p50': round(float(p50), 2), 'p99': round(float(p99), 2)}
+        return m
+
+
+def records(a, names):
+    # Detections.numpy() columns as a list of dicts, same keys as results.pandas().xyxy[i].to_json(orient='records')
+    return [{
+        'xmin': x0,
+        'ymin': y0,
+        'xmax': x1,
+        'ymax': y1,
+        'confidence': conf,
+        'class': c,
+        'name': names[c]}
+            for (x0, y0, x1, y1), conf, c in zip(a['boxes'].round(2).tolist(), a['scores'].round(4).tolist(),
+                                                 a['classes'].tolist())]
+
+
+def layout():
+    # Response layout from ?layout=records (default, one dict per box) or ?layout=columns (Detections.to_json layout)
+    return Detections.columns if request.args.get('layout') == 'columns' else records
+
+
+def respond(obj, status=200, headers=None):
+    # Compact JSON, or msgpack when the client prefers it and msgpack is installed
+    best = request.accept_mimetypes.best_match(['application/json', 'application/msgpack'])
+    if msgpack and best == 'application/msgpack':
+        return Response(msgpack.packb(obj), status, headers, mimetype='application/msgpack')
+    return Response(json.dumps(obj, separators=(',', ':')), status, headers, mimetype='application/json')
 
 
 @app.route(DETECTION_URL, methods=['POST'])
 def predict(model):
-    if request.method != 'POST':
-        return
+    if model not in models:
+        return respond({'error': f'unknown model {model}'}, 404)
+    if not request.files.get('image'):
+        return respond({'error': 'missing image'}, 400)
+
+    im_bytes = request.files['image'].read()
+    im = np.asarray(exif_transpose(Image.open(io.BytesIO(im_bytes))).convert('RGB'))  # decode on the request thread
+    try:
+        a, t = models[model].submit(im).result(timeout=REQUEST_TIMEOUT)
+    except queue.Full:
+        return respond({'error': f'{model} queue full'}, 503)
+    except FutureTimeoutError:
+        return respond({'error': f'{model} timed out'}, 503)
+    timing = f"queue;dur={t['queue'] * 1E3:.1f}, inference;dur={t['inference'] * 1E3:.1f}"
+    headers = {'Server-Timing': timing, 'X-Batch-Size': str(t['batch'])}
+    return respond(layout()(a, models[model].model.names), headers=headers)
+
+
+def jpeg_end(buf, pos, scan=False):
+    # Walk JPEG marker segments from pos (past SOI) by their lengths, so EOI bytes inside a segment, i.e. an EXIF
+    # thumbnail in APP1, do not end the image. Returns (end offset or None if more bytes are needed, pos, scan)
+    n = len(buf)
+    while True:
+        if scan:  # entropy-coded data: a marker is 0xFF followed by anything but 0x00 (byte stuffing) or RSTn
+            j = buf.find(b'\xff', pos)
+            while 0 <= j < n - 1 and (buf[j + 1] == 0 or 0xd0 <= buf[j + 1] <= 0xd7):
+                j = buf.find(b'\xff', j + 2)
+            if j < 0 or j == n - 1:
+                return None, n if j < 0 else j, True
+            pos, scan = j, False
+        if pos + 1 >= n:
+            return None, pos, False
+        if buf[pos] != 0xff:
+            raise ValueError(f'no JPEG marker at offset {pos}')
+        m = buf[pos + 1]
+        if m == 0xff:  # fill byte
+            pos += 1
+        elif m == 0xd9:  # EOI
+            return pos + 2, pos, False
+        elif m == 0x01 or 0xd0 <= m <= 0xd7:  # markers without a length
+            pos += 2
+        elif pos + 4 > n or pos + 2 + (buf[pos + 2] << 8 | buf[pos + 3]) > n:
+            return None, pos, False
+        else:
+            pos, scan = pos + 2 + (buf[pos + 2] << 8 | buf[pos + 3]), m == 0xda  # SOS is followed by scan data
+
+
+def split_jpegs(stream, chunk=1 << 16):
+    # Yield JPEG byte strings from a file-like MJPEG, multipart or concatenated JPEG stream as bytes arrive
+    buf, pos, scan = bytearray(), None, False  # pos: where to resume walking the JPEG at buf[0], None before SOI
+    while True:
+        b = stream.read(chunk)
+        if not b:
+            return
+        buf += b
+        while True:
+            if pos is None:
+                i = buf.find(b'\xff\xd8')  # SOI
+                if i < 0:
+                    del buf[:-1]  # keep a possible split marker byte
+                    break
+                del buf[:i]
+                pos, scan = 2, False
+            try:
+                end, pos, scan = jpeg_end(buf, pos, scan)
+            except ValueError:  # not a JPEG after all, resync on the next SOI
+                del buf[:2]
+                pos = None
+                continue
+            if end is None:
+                break
+            yield bytes(buf[:end])
+            del buf[:end]
+            pos = None
+
+
+def iter_frames(stride=1):
+    # (frame index, HWC RGB image) of the request: a 'video' file upload, or a MJPEG / multipart / JPEG stream body
+    if request.files.get('video'):
+        f = request.files['video']
+        with tempfile.NamedTemporaryFile(suffix=Path(f.filename or '').suffix or '.mp4') as tmp:
+            f.save(tmp)
+            tmp.flush()
+            cap = cv2.VideoCapture(tmp.name)
+            try:
+                n = 0
+                while cap.grab():
+                    n += 1
+                    if (n - 1) % stride == 0:
+                        ok, im = cap.retrieve()
+                        if ok:
+                            yield n - 1, im[..., ::-1]  # BGR to RGB
+            finally:
+                cap.release()
+    else:
+        for n, jpeg in enumerate(split_jpegs(request.stream)):
+            if n % stride == 0:
+                im = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+                if im is not None:
+                    yield n, im[..., ::-1]
+
+
+@app.route(STREAM_URL, methods=['POST'])
+def predict_stream(model):
+    # Per-frame detections streamed back while the upload is still decoding; frames share batches with other requests
+    if model not in models:
+        return respond({'error': f'unknown model {model}'}, 404)
+    m = models[model]
+    stride = max(int(request.args.get('stride', 1)), 1)
+    serialize, names = layout(), m.model.names
+    sse = request.args.get('format') == 'sse' or \
+        request.accept_mimetypes.best_match(['application/x-ndjson', 'text/event-stream']) == 'text/event-stream'
+
+    def line(obj):
+        s = json.dumps(obj, separators=(',', ':'))
+        return f'data: {s}\n\n' if sse else s + '\n'
+
+    def result(i, future):
+        # One frame's record; a model error or timeout is reported for that frame and the stream goes on
+        try:
+            return {'frame': i, 'detections': serialize(future.result(timeout=REQUEST_TIMEOUT)[0], names)}
+        except FutureTimeoutError:
+            return {'frame': i, 'error': f'{model} timed out'}
+        except Exception as e:
+            return {'frame': i, 'error': str(e)}
+
+    def generate():
+        pending, n, t0 = deque(), 0, time.perf_counter()  # (frame, future) in submission order
+        try:
+            for i, im in iter_frames(stride):
+                pending.append((i, m.submit(im)))  # keep up to 2 batches in flight, results return in order
+                n += 1
+                while len(pending) > 2 * m.max_batch or (pending and pending[0][1].done()):
+                    yield line(result(*pending.popleft()))
+            while pending:
+                yield line(result(*pending.popleft()))
+        except queue.Full:
+            yield line({'error': f'{model} queue full', 'frames': n})
+            return
+        dt = time.perf_counter() - t0
+        yield line({'done': True, 'frames': n, 'fps': round(n / dt, 2) if dt else 0})
 
-    if request.files.get('image'):
-        # Method 1
-        # with request.files["image"] as f:
-        #     im = Image.open(io.BytesIO(f.read()))
+    mimetype = 'text/event-stream' if sse else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers={'Cache-Control': 'no-cache'})
 
-        # Method 2
-        im_file = request.files['image']
-        im_bytes = im_file.read()
-        im = Image.open(io.BytesIO(im_bytes))
 
-        if model in models:
-            results = models[model](im, size=640)  # reduce size=320 for faster inference
-            return results.pandas().xyxy[0].to_json(orient='records')
+@app.route(METRICS_URL, methods=['GET'])
+def metrics():
+    return jsonify({k: m.metrics() for k, m in models.items()})
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Flask API exposing YOLOv5 model')
     parser.add_argument('--port', default=5000, type=int, help='port number')
     parser.add_argument('--model', nargs='+', default=['yolov5s'], help='model(s) to run, i.e. --model yolov5n yolov5s')
+    parser.add_argument('--device', default='', help='cuda device, i.e. 0 or cpu')
+    parser.add_argument('--half', action='store_true', help='use FP16 half-precision inference')
+    parser.add_argument('--size', default=640, type=int, help='inference size (pixels), reduce to 320 for speed')
+    parser.add_argument('--max-batch', default=8, type=int, help='maximum images per batch')
+    parser.add_argument('--max-wait-ms', default=10, type=float, help='max ms a request waits for its batch to fill')
     opt = parser.parse_args()
 
     for m in opt.model:
-        models[m] = torch.hub.load('ultralytics/yolov5', m, force_reload=True, skip_validation=True)
+        model = torch.hub.load(str(ROOT), 'custom', m, source='local', device=opt.device, half=opt.half)  # offline
+        models[m] = BatchedModel(m, model, opt.size, opt.max_batch, opt.max_wait_ms / 1E3)
 
-    app.run(host='0.0.0.0', port=opt.port)  # debug=True causes Restarting with stat
\ No newline at end of file
+    app.run(host='0.0.0.0', port=opt.port, threaded=True)  # debug=True causes Restarting with stat
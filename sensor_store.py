@@ -0,0 +1,357 @@
+# sensor_store.py
+
+"""
+Buffered ingestion for feeder sensor readings (temperature, humidity, weight)
+
+Usage:
+    from sensor_store import SensorIngestor
+    ingestor = SensorIngestor(engine).start()
+    ingestor.submit({'temperature': 24.1, 'humidity': 40.0, 'weight': 120.5})
+    ingestor.submit_many([{...}, {...}])
+    ingestor.latest('weight')  # served from memory
+    ingestor.listeners.append(lambda latest: print(latest))  # push on every new reading
+    query_series(engine, start, end, width=1200)  # min/max/mean per pixel from raw rows or rollups
+
+Usage - benchmark against an SQLite stand-in:
+    $ python sensor_store.py --benchmark --seconds 5
+"""
+
+import argparse
+import logging
+import math
+import queue
+import threading
+import time
+import weakref
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+from sqlalchemy.exc import DisconnectionError, InterfaceError, OperationalError
+
+FIELDS = 'temperature', 'humidity', 'weight'
+CONNECTION_ERRORS = DisconnectionError, InterfaceError, OperationalError  # transient, keep the rows for a retry
+INSERT_SQL = text("INSERT INTO sensor_data (temperature, humidity, weight, timestamp) "
+                  "VALUES (:temperature, :humidity, :weight, :timestamp)")
+
+
+def parse_reading(data):
+    # dict-like (form or JSON) to a sensor_data row, raises ValueError/TypeError on bad input
+    reading = {k: float(data[k]) if data.get(k) not in (None, '') else None for k in FIELDS}
+    if all(v is None for v in reading.values()):
+        raise ValueError(f'reading has none of {FIELDS}')
+    bad = [k for k, v in reading.items() if v is not None and not math.isfinite(v)]
+    if bad:
+        raise ValueError(f'non-finite {", ".join(bad)} in reading')
+    t = data.get('timestamp')
+    t = datetime.fromisoformat(t) if isinstance(t, str) else datetime.utcnow()
+    reading['timestamp'] = t.astimezone(timezone.utc).replace(tzinfo=None) if t.tzinfo else t  # naive UTC
+    return reading
+
+
+SENSOR_ROLLUP_RESOLUTIONS = {  # resolution: (seconds, bucket start for a datetime)
+    'minute': (60, lambda t: t.replace(second=0, microsecond=0)),
+    'hour': (3600, lambda t: t.replace(minute=0, second=0, microsecond=0))}
+SENSOR_ROLLUP_COLUMNS = [f'{f}_{a}' for f in FIELDS for a in ('n', 'sum', 'min', 'max')]
+_rollups_ready = weakref.WeakSet()  # engines with sensor_rollup created
+_rollups_lock = threading.Lock()
+
+
+def _sql(dialect, mysql, other):
+    # Pick the MySQL or SQLite spelling of a SQL fragment
+    return mysql if dialect == 'mysql' else other
+
+
+def ensure_sensor_rollups(engine):
+    # Create sensor_rollup and backfill it from sensor_data if it is empty, once per engine
+    with _rollups_lock:
+        if engine not in _rollups_ready:
+            _create_sensor_rollups(engine)
+            _rollups_ready.add(engine)
+
+
+def _create_sensor_rollups(engine):
+    columns = ', '.join(f'{c} {"INT NOT NULL DEFAULT 0" if c.endswith("_n") else "DOUBLE"}' for c in SENSOR_ROLLUP_COLUMNS)
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS sensor_rollup (resolution VARCHAR(8) NOT NULL, "
+                          f"bucket DATETIME NOT NULL, {columns}, PRIMARY KEY (resolution, bucket))"))
+        if conn.execute(text("SELECT 1 FROM sensor_rollup LIMIT 1")).fetchone() is None:
+            d = conn.dialect.name
+            aggregates = ', '.join(f'COUNT({f}), SUM({f}), MIN({f}), MAX({f})' for f in FIELDS)
+            for resolution, fmt in (('minute', ('%Y-%m-%d %H:%i:00', '%Y-%m-%d %H:%M:00')),
+                                    ('hour', ('%Y-%m-%d %H:00:00', '%Y-%m-%d %H:00:00'))):
+                bucket = _sql(d, f"DATE_FORMAT(timestamp, '{fmt[0]}')", f"strftime('{fmt[1]}', timestamp)")
+                conn.execute(text(f"INSERT INTO sensor_rollup (resolution, bucket, {', '.join(SENSOR_ROLLUP_COLUMNS)}) "
+                                  f"SELECT '{resolution}', {bucket} AS b, {aggregates} FROM sensor_data "
+                                  f"WHERE timestamp IS NOT NULL GROUP BY b"))
+
+
+def upsert_sensor_rollups(conn, readings):
+    # Add readings to the minute and hour rows of sensor_rollup, in the caller's transaction
+    buckets = {}
+    for r in readings:
+        for resolution, (_, floor) in SENSOR_ROLLUP_RESOLUTIONS.items():
+            b = buckets.setdefault((resolution, floor(r['timestamp'])),
+                                   {c: 0 if c.endswith('_n') else None for c in SENSOR_ROLLUP_COLUMNS})
+            for f in FIELDS:
+                v = r[f]
+                if v is not None:
+                    b[f'{f}_n'] += 1
+                    b[f'{f}_sum'] = (b[f'{f}_sum'] or 0.0) + v
+                    b[f'{f}_min'] = v if b[f'{f}_min'] is None else min(b[f'{f}_min'], v)
+                    b[f'{f}_max'] = v if b[f'{f}_max'] is None else max(b[f'{f}_max'], v)
+    if not buckets:
+        return
+    d = conn.dialect.name
+    new = (lambda c: f'VALUES({c})') if d == 'mysql' else (lambda c: f'excluded.{c}')
+    least, greatest = _sql(d, 'LEAST', 'MIN'), _sql(d, 'GREATEST', 'MAX')
+    updates = []
+    for c in SENSOR_ROLLUP_COLUMNS:
+        if c.endswith(('_n', '_sum')):
+            updates.append(f'{c} = COALESCE({c}, 0) + COALESCE({new(c)}, 0)')
+        else:
+            f = least if c.endswith('_min') else greatest
+            updates.append(f'{c} = {f}(COALESCE({c}, {new(c)}), COALESCE({new(c)}, {c}))')
+    sql = f"INSERT INTO sensor_rollup (resolution, bucket, {', '.join(SENSOR_ROLLUP_COLUMNS)}) " \
+          f"VALUES (:resolution, :bucket, {', '.join(':' + c for c in SENSOR_ROLLUP_COLUMNS)}) " + \
+          _sql(d, 'ON DUPLICATE KEY UPDATE ', 'ON CONFLICT (resolution, bucket) DO UPDATE SET ') + ', '.join(updates)
+    conn.execute(text(sql), [{'resolution': r, 'bucket': b, **v} for (r, b), v in buckets.items()])
+
+
+def query_series(engine, start, end, width=1200):
+    # Downsampled min/max/mean series for [start, end) with at most width buckets, i.e. one bucket per pixel.
+    # Reads raw sensor_data only for short windows, else the minute or hour rollup, so cost is bounded by width
+    ensure_sensor_rollups(engine)
+    span = max((end - start).total_seconds(), 1)
+    step = max(int(span // max(width, 1)), 1)  # seconds per bucket
+    with engine.connect() as conn:
+        d = conn.dialect.name
+        if step < 60:
+            source, column, where, params = 'raw', 'timestamp', '', {}
+            aggregates = ', '.join(f'AVG({f}), MIN({f}), MAX({f})' for f in FIELDS)
+            table = 'sensor_data'
+        else:
+            source = 'minute' if step < 3600 else 'hour'
+            column, where, params = 'bucket', 'resolution = :resolution AND ', {'resolution': source}
+            aggregates = ', '.join(f'SUM({f}_sum) / NULLIF(SUM({f}_n), 0), MIN({f}_min), MAX({f}_max)' for f in FIELDS)
+            table = 'sensor_rollup'
+        bucket = _sql(d, f'FLOOR(UNIX_TIMESTAMP({column}) / :step)', f"CAST(strftime('%s', {column}) AS INTEGER) / :step")
+        rows = conn.execute(
+            text(f"SELECT MIN({column}) AS t, {aggregates} FROM {table} "
+                 f"WHERE {where}{column} >= :start AND {column} < :end GROUP BY {bucket} ORDER BY t"),
+            {**params, 'start': start, 'end': end, 'step': step}).fetchall()
+
+    series = {'timestamps': [], 'resolution': source, 'step': step}
+    for f in FIELDS:
+        series[f] = {'mean': [], 'min': [], 'max': []}
+    for row in rows:
+        t = row[0]
+        series['timestamps'].append(t.strftime('%Y-%m-%d %H:%M:%S') if isinstance(t, datetime) else str(t)[:19])
+        for i, f in enumerate(FIELDS):
+            for j, k in enumerate(('mean', 'min', 'max')):
+                v = row[1 + 3 * i + j]
+                series[f][k].append(None if v is None else round(float(v), 3))
+    return series
+
+
+class SensorIngestor:
+    # Coalesces sensor readings into bulk INSERTs on a size or time window and keeps the latest values in memory
+    def __init__(self, engine, maxsize=100000, batch_size=500, flush_interval=1.0, rollups=True):
+        self.engine = engine
+        self.rollups = rollups  # keep sensor_rollup up to date for query_series()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._latest = {}  # field: (value, timestamp)
+        self._loaded = False  # latest values seeded from the database
+        self.listeners = []  # callables receiving latest() after every submit, i.e. a Socket.IO broadcast
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.metrics = {'received': 0, 'written': 0, 'dropped': 0, 'rejected': 0, 'failures': 0, 'batches': 0}
+
+    def submit(self, data):
+        # Queue one reading (dict-like), returns the parsed row
+        return self.submit_many([data])[0]
+
+    def submit_many(self, readings):
+        # Queue a batch of readings, update the latest values and notify listeners once. Returns the parsed rows
+        readings = [parse_reading(x) for x in readings]
+        with self._lock:
+            for reading in readings:
+                for k in FIELDS:
+                    if reading[k] is not None and reading['timestamp'] >= self._latest.get(k, (None, datetime.min))[1]:
+                        self._latest[k] = reading[k], reading['timestamp']
+        for reading in readings:
+            try:
+                self._queue.put_nowait(reading)
+                self.metrics['received'] += 1
+            except queue.Full:
+                self.metrics['dropped'] += 1
+                logging.warning('Sensor ingestion queue full, dropping reading')
+        if readings:
+            latest = self.latest()
+            for listener in self.listeners:
+                try:
+                    listener(latest)
+                except Exception as e:
+                    logging.error(f"Sensor listener failed: {e}")
+        return readings
+
+    def load_latest(self):
+        # Seed the latest values from the newest sensor_data row (once, e.g. after a restart)
+        with self.engine.connect() as conn:
+            row = conn.execute(text("SELECT temperature, humidity, weight, timestamp FROM sensor_data "
+                                    "ORDER BY timestamp DESC LIMIT 1")).fetchone()
+        with self._lock:
+            self._loaded = True
+            if row:
+                t = datetime.fromisoformat(row[3]) if isinstance(row[3], str) else row[3]  # SQLite returns str
+                for k, v in zip(FIELDS, row[:3]):
+                    if v is not None and k not in self._latest:
+                        self._latest[k] = v, t
+
+    def latest(self, field=None):
+        # Latest value per field from memory, i.e. latest('weight') -> 120.5, latest() -> {'weight': 120.5, ...}
+        if not self._loaded:
+            try:
+                self.load_latest()
+            except Exception as e:
+                self._loaded = True  # new readings will fill the store, do not retry on every request
+                logging.error(f"Error loading latest sensor values: {e}")
+        with self._lock:
+            if field:
+                return self._latest.get(field, (None, None))[0]
+            latest = {k: v for k, (v, _) in self._latest.items()}
+            ts = [t for _, t in self._latest.values()]
+            latest['timestamp'] = max(ts).isoformat() if ts else None
+            return latest
+
+    def flush(self):
+        # Bulk insert queued readings, returns number of rows written
+        rows = []
+        while len(rows) < self.batch_size * 10:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if not rows:
+            return 0
+        try:
+            self._write(rows)
+        except CONNECTION_ERRORS as e:
+            self.metrics['failures'] += 1
+            logging.error(f"Error saving {len(rows)} sensor readings: {e}")
+            self._requeue(rows)
+            return 0
+        except Exception as e:  # the data itself, i.e. a row the database refuses: write rows one by one
+            self.metrics['failures'] += 1
+            logging.error(f"Error saving {len(rows)} sensor readings, retrying row by row: {e}")
+            return self._write_each(rows)
+        return len(rows)
+
+    def _write(self, rows):
+        # Insert rows (and their rollups) in one transaction
+        if self.rollups:
+            ensure_sensor_rollups(self.engine)
+        with self.engine.begin() as conn:
+            for i in range(0, len(rows), self.batch_size):
+                conn.execute(INSERT_SQL, rows[i:i + self.batch_size])  # executemany
+                self.metrics['batches'] += 1
+            if self.rollups:
+                upsert_sensor_rollups(conn, rows)
+        self.metrics['written'] += len(rows)
+
+    def _write_each(self, rows):
+        # Write rows individually and drop the ones the database rejects instead of re-queuing them forever
+        n = 0
+        for i, row in enumerate(rows):
+            try:
+                self._write([row])
+                n += 1
+            except CONNECTION_ERRORS as e:
+                logging.error(f"Error saving sensor readings: {e}")
+                self._requeue(rows[i:])
+                break
+            except Exception as e:
+                self.metrics['rejected'] += 1
+                logging.warning(f"Rejected sensor reading {row}: {e}")
+        return n
+
+    def _requeue(self, rows):
+        for row in rows:  # retry on the next flush if there is room
+            try:
+                self._queue.put_nowait(row)
+            except queue.Full:
+                self.metrics['dropped'] += 1
+
+    def _run(self):
+        last = time.monotonic()
+        while not self._stop.is_set():
+            if self._queue.qsize() >= self.batch_size or time.monotonic() - last >= self.flush_interval:
+                self.flush()
+                last = time.monotonic()
+            self._stop.wait(min(0.05, self.flush_interval))
+        while self._queue.qsize() and self.flush():
+            pass
+
+    def start(self):
+        # Start the background flush thread
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        # Stop the flush thread after writing everything queued
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+
+def benchmark(seconds=5.0, producers=4, batch_size=500, url='sqlite://'):
+    # Sustained readings/s through submit() and bulk inserts into an SQLite (or any SQLAlchemy URL) stand-in
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import StaticPool
+    kwargs = {'poolclass': StaticPool, 'connect_args': {'check_same_thread': False}} if url == 'sqlite://' else {}
+    engine = create_engine(url, **kwargs)  # in-memory SQLite must share one connection across threads
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS sensor_data (id INTEGER PRIMARY KEY, temperature FLOAT, "
+                          "humidity FLOAT, weight FLOAT, timestamp DATETIME)"))
+    ingestor = SensorIngestor(engine, batch_size=batch_size).start()
+    stop = threading.Event()
+
+    def produce():
+        while not stop.is_set():
+            ingestor.submit({'temperature': '24.5', 'humidity': '41.0', 'weight': '120.25'})
+
+    threads = [threading.Thread(target=produce, daemon=True) for _ in range(producers)]
+    t = time.perf_counter()
+    for x in threads:
+        x.start()
+    time.sleep(seconds)
+    stop.set()
+    for x in threads:
+        x.join()
+    ingestor.stop()
+    dt = time.perf_counter() - t
+    m = ingestor.metrics
+    print(f"{m['received']} readings received, {m['written']} written in {m['batches']} batches, "
+          f"{m['dropped']} dropped over {dt:.1f}s: {m['written'] / dt:.0f} readings/s sustained")
+    return m['written'] / dt
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--benchmark', action='store_true', help='run the ingestion benchmark')
+    parser.add_argument('--seconds', type=float, default=5.0, help='benchmark duration')
+    parser.add_argument('--producers', type=int, default=4, help='concurrent producer threads')
+    parser.add_argument('--batch-size', type=int, default=500, help='rows per bulk INSERT')
+    parser.add_argument('--url', default='sqlite://', help='SQLAlchemy database URL')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    opt = parse_opt()
+    if opt.benchmark:
+        benchmark(opt.seconds, opt.producers, opt.batch_size, opt.url)
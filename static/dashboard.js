@@ -58,6 +58,9 @@ var weightBarChart = new Chart(ctx2, {
 
 // 실시간 무게 업데이트
 var socket = io.connect('http://127.0.0.1:5000');
+socket.on('connect', function() {
+    socket.emit('subscribe_sensors');  // 새 측정값을 서버에서 push로 받습니다.
+});
 socket.on('update_weight', function(data) {
     document.getElementById('weightValue').innerText = data.weight;
 });
@@ -108,9 +108,8 @@ def replicate(im, labels):
     return im, labels
 
 
-def letterbox(im, new_shape=(640, 640), color=(114, 114, 114), auto=True, scaleFill=False, scaleup=True, stride=32):
-    # Resize and pad image while meeting stride-multiple constraints
-    shape = im.shape[:2]  # current shape [height, width]
+def letterbox_geometry(shape, new_shape=(640, 640), auto=True, scaleFill=False, scaleup=True, stride=32):
+    # letterbox() geometry for an image of shape (h, w): ratios, resized (w, h), (dw, dh) and (top, bottom, left, right)
     if isinstance(new_shape, int):
         new_shape = (new_shape, new_shape)
 
@@ -132,13 +131,136 @@ def letterbox(im, new_shape=(640, 640), color=(114, 114, 114), auto=True, scaleF
 
     dw /= 2  # divide padding into 2 sides
     dh /= 2
+    border = int(round(dh - 0.1)), int(round(dh + 0.1)), int(round(dw - 0.1)), int(round(dw + 0.1))
+    return ratio, new_unpad, (dw, dh), border
 
-    if shape[::-1] != new_unpad:  # resize
+
+def letterbox(im, new_shape=(640, 640), color=(114, 114, 114), auto=True, scaleFill=False, scaleup=True, stride=32):
+    # Resize and pad image while meeting stride-multiple constraints
+    ratio, new_unpad, pad, (top, bottom, left, right) = letterbox_geometry(im.shape[:2], new_shape, auto, scaleFill,
+                                                                            scaleup, stride)
+    if im.shape[1::-1] != new_unpad:  # resize
         im = cv2.resize(im, new_unpad, interpolation=cv2.INTER_LINEAR)
-    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
-    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
     im = cv2.copyMakeBorder(im, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)  # add border
-    return im, ratio, (dw, dh)
+    return im, ratio, pad
+
+
+def letterbox_chw(im,
+                  new_shape=(640, 640),
+                  color=(114, 114, 114),
+                  auto=True,
+                  scaleFill=False,
+                  scaleup=True,
+                  stride=32,
+                  bgr=True,
+                  normalize=False,
+                  out=None):
+    # Fused letterbox() + HWC to CHW + BGR to RGB (+ uint8 to float32 / 255 if normalize): a resize, then one strided
+    # write of the converted pixels into the padded CHW output, into `out` if given, no padded HWC copy. Bit-identical
+    # to np.ascontiguousarray(letterbox(im)[0].transpose((2, 0, 1))[::-1]) and, if normalize, to torch CPU float32 / 255
+    ratio, new_unpad, pad, (top, bottom, left, right) = letterbox_geometry(im.shape[:2], new_shape, auto, scaleFill,
+                                                                            scaleup, stride)
+    if im.shape[1::-1] != new_unpad:  # resize
+        im = cv2.resize(im, new_unpad, interpolation=cv2.INTER_LINEAR)
+    w, h = new_unpad
+    if out is None:
+        out = np.empty((3, h + top + bottom, w + left + right), np.float32 if normalize else np.uint8)
+    src = (im[..., ::-1] if bgr else im).transpose((2, 0, 1))  # BGR to RGB, HWC to CHW views
+    c = np.array(color[::-1] if bgr else color, np.uint8)[:, None, None]  # border color in output channel order
+    if normalize:
+        src = np.ascontiguousarray(src)  # uint8 CHW first, a strided uint8 to float32 cast is ~2x slower
+        np.divide(src, np.float32(255), out=out[:, top:top + h, left:left + w], dtype=np.float32)
+        c = np.divide(c, np.float32(255), dtype=np.float32)
+    else:
+        np.copyto(out[:, top:top + h, left:left + w], src)
+    out[:, :top] = c  # add border
+    out[:, top + h:] = c
+    out[:, top:top + h, :left] = c
+    out[:, top:top + h, left + w:] = c
+    return out, ratio, pad
+
+
+class Preprocessor:
+    # Inference preprocessing into reused buffers: frames are letterboxed straight into a (pinned) uint8 host buffer of
+    # the input shape, copied to the device and converted/normalized in place into a reused fp16/32 input tensor.
+    # Buffers are kept per input shape and rotated over `slots` sets, so a returned tensor stays valid for `slots` calls
+    # (pipelined stages need queue size + 2). Steady state allocates nothing per frame, see summary()
+    def __init__(self, img_size=640, stride=32, auto=True, device='cpu', half=False, slots=1, color=114):
+        self.img_size = (img_size, img_size) if isinstance(img_size, int) else tuple(img_size)
+        self.stride = stride
+        self.auto = auto
+        self.color = color
+        self.device = torch.device(device)
+        self.dtype = torch.float16 if half else torch.float32
+        self.slots = slots
+        self.buffers = {}  # (layout, n, h, w): [(host uint8, device uint8 or None, device fp16/32 BCHW)] * slots
+        self.calls = 0
+        self.frames = 0
+        self.allocs = 0  # tensors allocated, plus resizes that could not write into the buffer
+
+    def _geometry(self, shape, auto):
+        # letterbox() geometry for an image of shape (h, w): resized (w, h), padded (h, w), (top, left) padding
+        _, (w, h), _, (top, bottom, left, right) = letterbox_geometry(shape, self.img_size, auto, stride=self.stride)
+        return (w, h), (h + top + bottom, w + left + right), (top, left)
+
+    def geometry(self, ims):
+        # Letterbox geometry per image, minimum rectangles only if they agree across the batch
+        g = [self._geometry(im.shape, self.auto) for im in ims]
+        return g if len({x[1] for x in g}) == 1 else [self._geometry(im.shape, False) for im in ims]
+
+    def shape(self, ims):
+        return self.geometry(ims)[0][1]  # inference (h, w)
+
+    def _buffers(self, layout, shape):
+        # Next slot of host, device and input buffers for this layout and shape, allocated on first use
+        key = (layout, *shape)
+        if key not in self.buffers:
+            n, h, w = shape
+            hw = (n, h, w, 3) if layout == 'hwc' else (n, 3, h, w)
+            cuda = self.device.type == 'cuda'
+            self.buffers[key] = [(torch.empty(hw, dtype=torch.uint8, pin_memory=cuda),
+                                  torch.empty(hw, dtype=torch.uint8, device=self.device) if cuda else None,
+                                  torch.empty((n, 3, h, w), dtype=self.dtype, device=self.device))
+                                 for _ in range(self.slots)]
+            self.allocs += self.slots * (3 if cuda else 2)
+        self.calls += 1
+        return self.buffers[key][self.calls % self.slots]
+
+    def __call__(self, ims):
+        # HWC BGR uint8 images -> normalized BCHW RGB input tensor
+        g = self.geometry(ims)
+        host, dev, out = self._buffers('hwc', (len(ims), *g[0][1]))
+        for im, b, ((w, h), _, (top, left)) in zip(ims, host.numpy(), g):
+            b[:top] = self.color  # padding
+            b[top + h:] = self.color
+            b[top:top + h, :left] = self.color
+            b[top:top + h, left + w:] = self.color
+            roi = b[top:top + h, left:left + w]
+            if im.shape[:2] == (h, w):
+                roi[:] = im
+            else:
+                r = cv2.resize(im, (w, h), dst=roi, interpolation=cv2.INTER_LINEAR)
+                if not np.may_share_memory(r, b):  # not resized in place
+                    roi[:] = r
+                    self.allocs += 1
+        src = host if dev is None else dev.copy_(host, non_blocking=True)
+        for c in range(3):  # BGR to RGB, BHWC to BCHW, uint8 to fp16/32
+            out[:, c].copy_(src[..., 2 - c])
+        self.frames += len(ims)
+        return out.div_(255)  # 0 - 255 to 0.0 - 1.0
+
+    def tensor(self, im):
+        # Letterboxed CHW/BCHW RGB uint8 array from a dataloader -> normalized BCHW input tensor
+        im = im[None] if im.ndim == 3 else im  # expand for batch dim
+        host, dev, out = self._buffers('chw', (im.shape[0], *im.shape[2:]))
+        host.numpy()[:] = im
+        out.copy_(host if dev is None else dev.copy_(host, non_blocking=True))
+        self.frames += len(im)
+        return out.div_(255)
+
+    def summary(self):
+        return f'Preprocess: {self.allocs} buffer allocations for {self.frames} frames ' \
+               f'({self.allocs / max(self.frames, 1):.3f} per frame), {len(self.buffers)} input shapes'
 
 
 def random_perspective(im,
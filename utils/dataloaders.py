@@ -12,10 +12,11 @@ import os
 import random
 import shutil
 import time
+from collections import deque
 from itertools import repeat
 from multiprocessing.pool import Pool, ThreadPool
 from pathlib import Path
-from threading import Thread
+from threading import Condition, Event, Thread
 from urllib.parse import urlparse
 
 import numpy as np
@@ -29,7 +30,7 @@ from torch.utils.data import DataLoader, Dataset, dataloader, distributed
 from tqdm import tqdm
 
 from utils.augmentations import (Albumentations, augment_hsv, classify_albumentations, classify_transforms, copy_paste,
-                                 letterbox, mixup, random_perspective)
+                                 letterbox, letterbox_chw, letterbox_geometry, mixup, random_perspective)
 from utils.general import (DATASETS_DIR, LOGGER, NUM_THREADS, TQDM_BAR_FORMAT, check_dataset, check_requirements,
                            check_yaml, clean_str, cv2, is_colab, is_kaggle, segments2boxes, unzip_file, xyn2xy,
                            xywh2xyxy, xywhn2xyxy, xyxy2xywhn)
@@ -229,30 +230,41 @@ class LoadScreenshots:
         if self.transforms:
             im = self.transforms(im0)  # transforms
         else:
-            im = letterbox(im0, self.img_size, stride=self.stride, auto=self.auto)[0]  # padded resize
-            im = im.transpose((2, 0, 1))[::-1]  # HWC to CHW, BGR to RGB
-            im = np.ascontiguousarray(im)  # contiguous
+            im = letterbox_chw(im0, self.img_size, stride=self.stride, auto=self.auto)[0]  # padded resize, CHW RGB
         self.frame += 1
         return str(self.screen), im, im0, None, s  # screen, img, original img, im0s, s
 
 
+def source_files(path):
+    # Files of a detect.py --source: file, dir, glob, list of those or *.txt listing them. Returns (files, last path)
+    if isinstance(path, str) and Path(path).suffix == '.txt':  # *.txt file with img/vid/dir on each line
+        path = Path(path).read_text().rsplit()
+    files = []
+    for p in sorted(path) if isinstance(path, (list, tuple)) else [path]:
+        p = str(Path(p).resolve())
+        if '*' in p:
+            files.extend(sorted(glob.glob(p, recursive=True)))  # glob
+        elif os.path.isdir(p):
+            files.extend(sorted(glob.glob(os.path.join(p, '*.*'))))  # dir
+        elif os.path.isfile(p):
+            files.append(p)  # files
+        else:
+            raise FileNotFoundError(f'{p} does not exist')
+    return files, p
+
+
 class LoadImages:
     # YOLOv5 image/video dataloader, i.e. `python detect.py --source image.jpg/vid.mp4`
-    def __init__(self, path, img_size=640, stride=32, auto=True, transforms=None, vid_stride=1):
-        if isinstance(path, str) and Path(path).suffix == '.txt':  # *.txt file with img/vid/dir on each line
-            path = Path(path).read_text().rsplit()
-        files = []
-        for p in sorted(path) if isinstance(path, (list, tuple)) else [path]:
-            p = str(Path(p).resolve())
-            if '*' in p:
-                files.extend(sorted(glob.glob(p, recursive=True)))  # glob
-            elif os.path.isdir(p):
-                files.extend(sorted(glob.glob(os.path.join(p, '*.*'))))  # dir
-            elif os.path.isfile(p):
-                files.append(p)  # files
-            else:
-                raise FileNotFoundError(f'{p} does not exist')
-
+    def __init__(self,
+                 path,
+                 img_size=640,
+                 stride=32,
+                 auto=True,
+                 transforms=None,
+                 vid_stride=1,
+                 interval=0.0,
+                 raw=False):
+        files, p = source_files(path)
         images = [x for x in files if x.split('.')[-1].lower() in IMG_FORMATS]
         videos = [x for x in files if x.split('.')[-1].lower() in VID_FORMATS]
         ni, nv = len(images), len(videos)
@@ -265,7 +277,9 @@ class LoadImages:
         self.mode = 'image'
         self.auto = auto
         self.transforms = transforms  # optional
+        self.raw = raw  # return im=None, letterboxing left to the caller, i.e. utils.augmentations.Preprocessor
         self.vid_stride = vid_stride  # video frame-rate stride
+        self.interval = interval  # minimum seconds of video time between returned frames, skipped ones are not decoded
         if any(videos):
             self._new_video(videos[0])  # new video
         else:
@@ -285,7 +299,7 @@ class LoadImages:
         if self.video_flag[self.count]:
             # Read video
             self.mode = 'video'
-            for _ in range(self.vid_stride):
+            for _ in range(self.vid_step):
                 self.cap.grab()
             ret_val, im0 = self.cap.retrieve()
             while not ret_val:
@@ -308,12 +322,12 @@ class LoadImages:
             assert im0 is not None, f'Image Not Found {path}'
             s = f'image {self.count}/{self.nf} {path}: '
 
-        if self.transforms:
+        if self.raw:
+            im = None
+        elif self.transforms:
             im = self.transforms(im0)  # transforms
         else:
-            im = letterbox(im0, self.img_size, stride=self.stride, auto=self.auto)[0]  # padded resize
-            im = im.transpose((2, 0, 1))[::-1]  # HWC to CHW, BGR to RGB
-            im = np.ascontiguousarray(im)  # contiguous
+            im = letterbox_chw(im0, self.img_size, stride=self.stride, auto=self.auto)[0]  # padded resize, CHW RGB
 
         return path, im, im0, self.cap, s
 
@@ -321,7 +335,10 @@ class LoadImages:
         # Create a new video capture object
         self.frame = 0
         self.cap = cv2.VideoCapture(path)
-        self.frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT) / self.vid_stride)
+        fps = self.cap.get(cv2.CAP_PROP_FPS)  # warning: may return 0 or nan
+        fps = max((fps if math.isfinite(fps) else 0) % 100, 0) or 30  # 30 FPS fallback
+        self.vid_step = max(self.vid_stride, round(self.interval * fps))  # frames grabbed per returned frame
+        self.frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT) / self.vid_step)
         self.orientation = int(self.cap.get(cv2.CAP_PROP_ORIENTATION_META))  # rotation degrees
         # self.cap.set(cv2.CAP_PROP_ORIENTATION_AUTO, 0)  # disable https://github.com/ultralytics/yolov5/issues/8493
 
@@ -339,18 +356,109 @@ class LoadImages:
         return self.nf  # number of files
 
 
+class LoadImageBatches:
+    # YOLOv5 batched image dataloader, i.e. `python detect.py --source dir/ --batch-size 16`
+    # A thread pool decodes and letterboxes the next window of files while the current batches are inferred. Images are
+    # grouped by letterboxed shape (fixed with auto=False, aspect-ratio buckets with auto=True) into stacked batches of
+    # up to batch_size, so batch order may differ from file order; each batch carries its own paths
+    def __init__(self, path, img_size=640, stride=32, auto=True, batch_size=16, workers=NUM_THREADS):
+        files, p = source_files(path)
+        videos = [x for x in files if x.split('.')[-1].lower() in VID_FORMATS]
+        assert not videos, f'Batched loading supports images only, found videos {videos[:3]}. Use --batch-size 1.'
+        self.files = [x for x in files if x.split('.')[-1].lower() in IMG_FORMATS]
+        self.nf = len(self.files)  # number of files
+        assert self.nf > 0, f'No images found in {p}. Supported formats are:\nimages: {IMG_FORMATS}'
+        self.img_size = img_size
+        self.stride = stride
+        self.auto = auto
+        self.batch_size = batch_size
+        self.workers = max(min(workers, batch_size), 1)
+        self.window = batch_size * 4  # files decoded per pool call
+        self.mode = 'image'
+        self.count = 0  # images returned
+
+    def _load(self, f):
+        im0 = cv2.imread(f)  # BGR
+        assert im0 is not None, f'Image Not Found {f}'
+        im = letterbox_chw(im0, self.img_size, stride=self.stride, auto=self.auto)[0]  # padded resize, CHW RGB
+        return f, im, im0
+
+    def _batch(self, items):
+        paths, ims, im0s = zip(*items)
+        self.count += len(paths)
+        return list(paths), np.stack(ims), list(im0s), None, f'images {self.count}/{self.nf} '
+
+    def __iter__(self):
+        windows = [self.files[i:i + self.window] for i in range(0, self.nf, self.window)]
+        buckets = {}  # letterboxed shape: [(path, im, im0)]
+        self.count = 0
+        with ThreadPool(self.workers) as pool:
+            pending = pool.map_async(self._load, windows[0])
+            for i in range(len(windows)):
+                items = pending.get()
+                if i + 1 < len(windows):
+                    pending = pool.map_async(self._load, windows[i + 1])  # decode ahead while batches are inferred
+                for item in items:
+                    bucket = buckets.setdefault(item[1].shape, [])
+                    bucket.append(item)
+                    if len(bucket) == self.batch_size:
+                        yield self._batch(buckets.pop(item[1].shape))
+        for bucket in buckets.values():  # partial batches
+            yield self._batch(bucket)
+
+    def __len__(self):
+        return self.nf  # number of files
+
+
 class LoadStreams:
     # YOLOv5 streamloader, i.e. `python detect.py --source 'rtsp://example.com/media.mp4'  # RTSP, RTMP, HTTP streams`
-    def __init__(self, sources='file.streams', img_size=640, stride=32, auto=True, transforms=None, vid_stride=1):
+    # Reader threads push (frame id, capture time, frame) into small per-stream ring buffers and __next__() blocks until
+    # every stream has one, leaving out live streams that lag the newest frame by `deadline` frame periods. Policies:
+    # 'latest' (default) retrieves the next grabbed frame per stream on demand (after `interval`), so skipped frames are
+    # never decoded; 'every' returns frames in order, dropping the oldest if a live stream outruns the consumer (video
+    # files wait instead); 'sync' batches the frames closest to a common capture time. Lost live streams reconnect with
+    # exponential backoff and jitter and are left out of batches while down, see self.streams for the stream indices of
+    # the last batch and health() for uptime, reconnects, late frames and latency
+    def __init__(self,
+                 sources='file.streams',
+                 img_size=640,
+                 stride=32,
+                 auto=True,
+                 transforms=None,
+                 vid_stride=1,
+                 interval=0.0,
+                 raw=False,
+                 policy='latest',
+                 buffer=4,
+                 backoff=0.5,
+                 max_backoff=30.0,
+                 deadline=3.0):
         torch.backends.cudnn.benchmark = True  # faster for fixed-size inference
         self.mode = 'stream'
         self.img_size = img_size
         self.stride = stride
         self.vid_stride = vid_stride  # video frame-rate stride
+        self.interval = interval  # minimum seconds between returned frames, i.e. 1 / target fps
+        self.policy = policy  # live default 'latest': newest frame, bounded latency; 'every' on request
+        assert self.policy in ('latest', 'every', 'sync'), f"invalid policy '{self.policy}', use latest, every or sync"
+        self.latest = self.policy == 'latest'  # retrieve frames on demand only
         sources = Path(sources).read_text().rsplit() if os.path.isfile(sources) else [sources]
         n = len(sources)
         self.sources = [clean_str(x) for x in sources]  # clean source names for later
         self.imgs, self.fps, self.frames, self.threads = [None] * n, [0] * n, [0] * n, [None] * n
+        self.buffers = [deque(maxlen=1 if self.latest else buffer) for _ in range(n)]  # (frame id, capture time, im)
+        self.cond = Condition()  # guards buffers and counters, notified on every push and pop
+        self.grabbed, self.decoded, self.returned, self.dropped = [0] * n, [0] * n, [0] * n, [0] * n
+        self.lag, self.lag_max, self.lag_sum, self.skew_max = [0.0] * n, [0.0] * n, [0.0] * n, 0.0  # seconds
+        self.frame_ids, self.timestamps = [0] * n, [0.0] * n  # of the last returned frames
+        self.streams = list(range(n))  # stream indices of the last returned batch, streams that are down are left out
+        self.backoff, self.max_backoff = backoff, max_backoff  # reconnect delay seconds, doubled per failed attempt
+        self.up, self.reconnects, self.failures = [True] * n, [0] * n, [0] * n
+        self.down_since, self.downtime = [0.0] * n, [0.0] * n  # seconds
+        self.deadline, self.late = deadline, [0] * n  # frame periods a stalled live stream may hold up a batch
+        self.start = time.time()
+        self.wanted = [Event() for _ in range(n)]  # latest mode: retrieve the next grabbed frame
+        self.next_time = 0.0  # earliest time of the next returned frame
         for i, s in enumerate(sources):  # index, source
             # Start thread to read frames from video stream
             st = f'{i + 1}/{n}: {s}... '
@@ -372,6 +480,9 @@ class LoadStreams:
             self.fps[i] = max((fps if math.isfinite(fps) else 0) % 100, 0) or 30  # 30 FPS fallback
 
             _, self.imgs[i] = cap.read()  # guarantee first frame
+            if not self.latest:
+                self.buffers[i].append((1, time.time(), self.imgs[i]))
+                self.grabbed[i] = self.decoded[i] = 1
             self.threads[i] = Thread(target=self.update, args=([i, cap, s]), daemon=True)
             LOGGER.info(f'{st} Success ({self.frames[i]} frames {w}x{h} at {self.fps[i]:.2f} FPS)')
             self.threads[i].start()
@@ -382,24 +493,68 @@ class LoadStreams:
         self.rect = np.unique(s, axis=0).shape[0] == 1  # rect inference if all shapes equal
         self.auto = auto and self.rect
         self.transforms = transforms  # optional
+        self.raw = raw  # return im=None, letterboxing left to the caller, i.e. utils.augmentations.Preprocessor
         if not self.rect:
             LOGGER.warning('WARNING ⚠️ Stream shapes differ. For optimal performance supply similarly-shaped streams.')
 
     def update(self, i, cap, stream):
-        # Read stream `i` frames in daemon thread
-        n, f = 0, self.frames[i]  # frame number, frame array
-        while cap.isOpened() and n < f:
+        # Read stream `i` frames in daemon thread into its ring buffer, blocking in grab() rather than spinning
+        n, f = 1 if self.latest else self.grabbed[i], self.frames[i]  # frame number, frame count
+        buffer = self.buffers[i]
+        wait = math.isfinite(f) and not self.latest  # video files: wait for buffer space instead of dropping frames
+        pace = math.isfinite(f) and self.latest  # video files: grab in real time like a live stream
+        t0 = time.time() - n / self.fps[i]
+        while n < f:
             n += 1
-            cap.grab()  # .read() = .grab() followed by .retrieve()
-            if n % self.vid_stride == 0:
+            if pace:
+                time.sleep(max(t0 + n / self.fps[i] - time.time(), 0))
+            success = cap.grab()  # .read() = .grab() followed by .retrieve()
+            t = time.time()  # capture time
+            self.grabbed[i] = n
+            if success and not (self.wanted[i].is_set() if self.latest else (n - 1) % self.vid_stride == 0):
+                continue  # latest: retrieve on request only
+            if success:
                 success, im = cap.retrieve()
-                if success:
-                    self.imgs[i] = im
-                else:
-                    LOGGER.warning('WARNING ⚠️ Video stream unresponsive, please check your IP camera connection.')
-                    self.imgs[i] = np.zeros_like(self.imgs[i])
-                    cap.open(stream)  # re-open stream if signal was lost
-            time.sleep(0.0)  # wait time
+            if not success:
+                if math.isfinite(f):  # end of video file
+                    break
+                self._reconnect(i, cap, stream)
+                continue
+            with self.cond:
+                if wait:
+                    self.cond.wait_for(lambda: len(buffer) < buffer.maxlen)
+                if len(buffer) == buffer.maxlen:
+                    self.dropped[i] += 1  # oldest frame overwritten
+                buffer.append((n, t, im))
+                self.decoded[i] += 1
+                self.failures[i] = 0
+                if not self.up[i]:
+                    self.up[i] = True
+                    self.downtime[i] += t - self.down_since[i]
+                    LOGGER.info(f'Stream {self.sources[i]} reconnected after {t - self.down_since[i]:.1f}s')
+                self.cond.notify_all()
+            if self.latest:
+                self.wanted[i].clear()
+        cap.release()
+        with self.cond:
+            if self.up[i]:
+                self.up[i], self.down_since[i] = False, time.time()
+            self.cond.notify_all()  # never leave __next__() waiting on a finished stream
+
+    def _reconnect(self, i, cap, stream):
+        # Reopen lost stream `i` with exponential backoff and full jitter, left out of batches until it delivers again
+        with self.cond:
+            if self.up[i]:
+                self.up[i], self.down_since[i] = False, time.time()
+                LOGGER.warning(f'WARNING ⚠️ Stream {self.sources[i]} lost, reconnecting with backoff...')
+            self.cond.notify_all()  # batches continue without this stream
+        cap.release()
+        while True:
+            self.failures[i] += 1  # consecutive failed attempts, reset by the next delivered frame
+            time.sleep(random.uniform(0, min(self.backoff * 2 ** (self.failures[i] - 1), self.max_backoff)))
+            if cap.open(stream):
+                break
+        self.reconnects[i] += 1
 
     def __iter__(self):
         self.count = -1
@@ -407,19 +562,109 @@ class LoadStreams:
 
     def __next__(self):
         self.count += 1
-        if not all(x.is_alive() for x in self.threads) or cv2.waitKey(1) == ord('q'):  # q to quit
+        if cv2.waitKey(1) == ord('q'):  # q to quit
+            cv2.destroyAllWindows()
+            raise StopIteration
+        time.sleep(max(self.next_time - time.time(), 0))
+        self.next_time = time.time() + self.interval
+        if self.latest:
+            self._request()
+        frames = self._take()
+        if frames is None:  # a stream ended
             cv2.destroyAllWindows()
             raise StopIteration
 
-        im0 = self.imgs.copy()
-        if self.transforms:
+        self.streams = list(frames)
+        self.frame_ids, self.timestamps, im0 = (list(x) for x in zip(*frames.values()))
+        for i, x in frames.items():
+            self.imgs[i] = x[2]
+        if self.raw:
+            im = None
+        elif self.transforms:
             im = np.stack([self.transforms(x) for x in im0])  # transforms
         else:
-            im = np.stack([letterbox(x, self.img_size, stride=self.stride, auto=self.auto)[0] for x in im0])  # resize
-            im = im[..., ::-1].transpose((0, 3, 1, 2))  # BGR to RGB, BHWC to BCHW
-            im = np.ascontiguousarray(im)  # contiguous
-
-        return self.sources, im, im0, None, ''
+            _, (w, h), _, (top, bottom, left, right) = letterbox_geometry(im0[0].shape[:2], self.img_size, self.auto,
+                                                                          stride=self.stride)
+            im = np.empty((len(im0), 3, h + top + bottom, w + left + right), np.uint8)
+            for x, y in zip(im0, im):
+                letterbox_chw(x, self.img_size, stride=self.stride, auto=self.auto, out=y)  # into the batch
+
+        return [self.sources[i] for i in self.streams], im, im0, None, ''
+
+    def _request(self):
+        # Latest mode: have every reader thread retrieve its next grabbed frame, _take() waits for them
+        for wanted in self.wanted:
+            wanted.set()
+
+    def _take(self):
+        # Pop {stream: (frame id, capture time, im)} by policy from every stream that is up, waiting while all are down.
+        # A live stream without a frame `deadline` frame periods after the newest frame of the batch is left out and
+        # counted as late, so one stalled camera that is still up does not hold up the others. None once a video file
+        # has ended and is drained, or every stream has stopped
+        with self.cond:
+            newest = None  # capture time of the newest frame for this batch when it started to form, fixed meanwhile
+            while True:
+                if any(not b and not x.is_alive() and math.isfinite(f)
+                       for b, x, f in zip(self.buffers, self.threads, self.frames)) or \
+                        not any(self.buffers) and not any(x.is_alive() for x in self.threads):
+                    return None
+                timeout = 0.1
+                if any(self.buffers):
+                    now, newest = time.time(), newest or max(b[0][1] for b in self.buffers if b)
+                    waiting = [i for i, (b, up) in enumerate(zip(self.buffers, self.up)) if not b and up]
+                    deadlines = [newest + self.deadline / self.fps[i] if math.isinf(self.frames[i]) else math.inf
+                                 for i in waiting]  # video files are always waited for
+                    if all(now >= t for t in deadlines):
+                        for i in waiting:
+                            self.late[i] += 1
+                        break
+                    timeout = min(min(t for t in deadlines if t > now) - now, timeout)
+                self.cond.wait(timeout)
+            buffers = {i: b for i, b in enumerate(self.buffers) if b}
+            if self.policy == 'sync':  # frames closest to the newest capture time of the stream furthest behind
+                t = min(b[-1][1] for b in buffers.values())
+                for i, b in buffers.items():
+                    while len(b) > 1 and abs(b[1][1] - t) <= abs(b[0][1] - t):
+                        b.popleft()
+                        self.dropped[i] += 1
+            frames = {i: b.popleft() for i, b in buffers.items()}
+            self.cond.notify_all()  # buffer space for waiting readers
+        now = time.time()
+        for i, (_, t, _) in frames.items():
+            self.returned[i] += 1
+            self.lag[i] = now - t
+            self.lag_max[i] = max(self.lag_max[i], self.lag[i])
+            self.lag_sum[i] += self.lag[i]
+        ts = [x[1] for x in frames.values()]
+        self.skew_max = max(self.skew_max, max(ts) - min(ts))
+        return frames
+
+    def health(self):
+        # Per-stream health: up, uptime fraction, reconnects, frame counts, returned FPS and capture-to-return lag
+        now = time.time()
+        elapsed = max(now - self.start, 1E-9)
+        return [{
+            'source': src,
+            'up': self.up[i],
+            'uptime': 1 - (self.downtime[i] + (0 if self.up[i] else now - self.down_since[i])) / elapsed,
+            'reconnects': self.reconnects[i],
+            'grabbed': self.grabbed[i],
+            'decoded': self.decoded[i],
+            'returned': self.returned[i],
+            'dropped': self.dropped[i],
+            'late': self.late[i],
+            'fps': self.returned[i] / elapsed,
+            'lag_ms': self.lag[i] * 1E3,
+            'lag_mean_ms': self.lag_sum[i] / max(self.returned[i], 1) * 1E3,
+            'lag_max_ms': self.lag_max[i] * 1E3} for i, src in enumerate(self.sources)]
+
+    def summary(self):
+        # Per-stream health, i.e. LOGGER.info(dataset.summary())
+        s = [f"{x['source']}: {'up' if x['up'] else 'down'} {x['uptime']:.0%}, {x['reconnects']} reconnects, "
+             f"{x['grabbed']} grabbed, {x['decoded']} decoded, {x['returned']} returned, {x['dropped']} dropped, "
+             f"{x['late']} late, lag {x['lag_mean_ms']:.0f}ms mean {x['lag_max_ms']:.0f}ms max" for x in self.health()]
+        skew = f', max batch skew {self.skew_max * 1E3:.0f}ms' if len(self.sources) > 1 else ''
+        return f"Streams ({self.policy}{skew}): " + '; '.join(s)
 
     def __len__(self):
         return len(self.sources)  # 1E12 frames = 32 streams at 30 FPS for 30 years
@@ -671,7 +916,10 @@ class LoadImagesAndLabels(Dataset):
 
             # Letterbox
             shape = self.batch_shapes[self.batch[index]] if self.rect else self.img_size  # final letterboxed shape
-            img, ratio, pad = letterbox(img, shape, auto=False, scaleup=self.augment)
+            if self.augment:
+                img, ratio, pad = letterbox(img, shape, auto=False, scaleup=self.augment)
+            else:  # fused with HWC to CHW, BGR to RGB
+                img, ratio, pad = letterbox_chw(img, shape, auto=False, scaleup=self.augment)
             shapes = (h0, w0), ((h / h0, w / w0), pad)  # for COCO mAP rescaling
 
             labels = self.labels[index].copy()
@@ -688,8 +936,9 @@ class LoadImagesAndLabels(Dataset):
                                                  perspective=hyp['perspective'])
 
         nl = len(labels)  # number of labels
+        ih, iw = img.shape[:2] if self.augment else img.shape[1:]  # already CHW without augmentation
         if nl:
-            labels[:, 1:5] = xyxy2xywhn(labels[:, 1:5], w=img.shape[1], h=img.shape[0], clip=True, eps=1E-3)
+            labels[:, 1:5] = xyxy2xywhn(labels[:, 1:5], w=iw, h=ih, clip=True, eps=1E-3)
 
         if self.augment:
             # Albumentations
@@ -720,8 +969,9 @@ class LoadImagesAndLabels(Dataset):
             labels_out[:, 1:] = torch.from_numpy(labels)
 
         # Convert
-        img = img.transpose((2, 0, 1))[::-1]  # HWC to CHW, BGR to RGB
-        img = np.ascontiguousarray(img)
+        if self.augment:
+            img = img.transpose((2, 0, 1))[::-1]  # HWC to CHW, BGR to RGB
+            img = np.ascontiguousarray(img)
 
         return torch.from_numpy(img), labels_out, self.im_files[index], shapes
 
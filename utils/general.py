@@ -11,11 +11,13 @@ import logging.config
 import math
 import os
 import platform
+import queue
 import random
 import re
 import signal
 import subprocess
 import sys
+import threading
 import time
 import urllib
 from copy import deepcopy
@@ -189,6 +191,156 @@ class Profile(contextlib.ContextDecorator):
         return time.time()
 
 
+class MotionGate:
+    # YOLOv5 change gate ahead of inference for static cameras. Usage: if gate(im0s): pred = model(im)  # else reuse
+    # Scores a downscaled grayscale frame per stream against the frame of the last inference ('diff') or with MOG2
+    # background subtraction ('mog2'), as the fraction of changed pixels
+    def __init__(self, threshold=0.01, hold=3, refresh=10.0, method='diff', diff=25, size=64):
+        self.threshold = threshold  # changed pixel fraction that opens the gate
+        self.hold = hold  # frames the gate stays open after the score drops below threshold (hysteresis)
+        self.refresh = refresh  # seconds, force inference at least this often
+        self.method = method  # 'diff' or 'mog2'
+        self.diff = diff  # gray level change counted as a changed pixel ('diff')
+        self.size = size  # downscaled frame width (pixels)
+        self.ref, self.mog = {}, {}  # per-stream gray frame of the last inference, MOG2 subtractors
+        self.streams = None  # streams of the last inference
+        self.open = 0  # remaining hold frames
+        self.last = 0.0  # time of the last inference
+        self.frames = self.gated = 0
+        self.score = 0.0
+        self.dt = Profile()  # gate cost
+
+    def __call__(self, ims, streams=None):
+        # Returns True if inference should run on this frame, ims = list of BGR HWC images (one per stream), streams =
+        # their stream indices if only some streams are present, i.e. LoadStreams.streams
+        with self.dt:
+            self.frames += 1
+            streams = list(range(len(ims)) if streams is None else streams)
+            grays = [self._gray(im) for im in ims]
+            self.score = max(self._score(i, g) for i, g in zip(streams, grays))
+            if self.score >= self.threshold:
+                self.open = self.hold + 1
+            run = self.open > 0 or streams != self.streams or time.time() - self.last >= self.refresh
+            self.open = max(self.open - 1, 0)
+            if run:  # a changed set of streams also runs, the last result would not match the batch
+                self.last = time.time()
+                self.ref.update(zip(streams, grays))
+                self.streams = streams
+            else:
+                self.gated += 1
+        return run
+
+    def _gray(self, im):
+        h, w = im.shape[:2]
+        im = cv2.resize(im, (self.size, max(round(self.size * h / w), 1)), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(im, cv2.COLOR_BGR2GRAY) if im.ndim == 3 else im
+
+    def _score(self, i, g):
+        if self.method == 'mog2':
+            if i not in self.mog:
+                self.mog[i] = cv2.createBackgroundSubtractorMOG2(detectShadows=False)
+            return float((self.mog[i].apply(g) > 0).mean())
+        ref = self.ref.get(i)
+        return 1.0 if ref is None or ref.shape != g.shape else float((cv2.absdiff(g, ref) > self.diff).mean())
+
+    def summary(self, dt=()):
+        # Gated fraction, compute saved from the per-run Profile times dt and gate cost, i.e. gate.summary(dt)
+        ran = self.frames - self.gated
+        saved = sum(x.t for x in dt) / ran * self.gated if ran else 0.0  # seconds not spent on gated frames
+        return (f'Motion gate: {self.gated}/{self.frames} frames gated ({self.gated / max(self.frames, 1):.0%}), '
+                f'{saved:.1f}s compute saved, {self.dt.t / max(self.frames, 1) * 1E3:.2f}ms gate per frame')
+
+
+class Pipeline:
+    # YOLOv5 pipelined execution: source iteration and every stage run on their own thread, linked by bounded FIFO
+    # queues, so stages overlap and results keep source order. Usage: for y in Pipeline([('infer', f), ...]).run(x):
+    class Error:
+        def __init__(self, e):
+            self.e = e
+
+    END = object()  # end of stream marker
+
+    def __init__(self, stages, maxsize=2):
+        self.stages = list(stages)  # [(name, fn)], fn(item) returns the next stage's item
+        self.maxsize = maxsize  # items queued between stages
+        self.dt = {name: Profile() for name in ['load'] + [name for name, _ in self.stages]}  # per-stage times
+        for p in self.dt.values():
+            p.cuda = False  # a device sync per stage would serialize the stages
+        self.n, self.t = 0, 0.0  # items out, wall time
+
+    def run(self, source):
+        stop = threading.Event()
+        queues = [queue.Queue(maxsize=self.maxsize) for _ in range(len(self.stages) + 1)]
+
+        def put(q, x):
+            while not stop.is_set():
+                try:
+                    q.put(x, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def get(q):
+            while not stop.is_set():
+                try:
+                    return q.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            return self.END
+
+        def load():
+            it = iter(source)
+            while True:
+                try:
+                    with self.dt['load']:
+                        x = next(it, self.END)
+                except Exception as e:
+                    x = self.Error(e)
+                if not put(queues[0], x) or x is self.END or isinstance(x, self.Error):
+                    return
+
+        def work(name, fn, qi, qo):
+            while True:
+                x = get(qi)
+                if x is not self.END and not isinstance(x, self.Error):
+                    try:
+                        with self.dt[name]:
+                            x = fn(x)
+                    except Exception as e:
+                        x = self.Error(e)
+                if not put(qo, x) or x is self.END or isinstance(x, self.Error):
+                    return
+
+        threads = [threading.Thread(target=load, name='pipeline-load', daemon=True)]
+        for i, (name, fn) in enumerate(self.stages):
+            args = name, fn, queues[i], queues[i + 1]
+            threads.append(threading.Thread(target=work, args=args, name=f'pipeline-{name}', daemon=True))
+        t = time.time()
+        for x in threads:
+            x.start()
+        try:
+            while True:
+                y = get(queues[-1])
+                if y is self.END:
+                    break
+                if isinstance(y, self.Error):
+                    raise y.e
+                self.n += 1
+                yield y
+        finally:
+            stop.set()
+            self.t += time.time() - t
+
+    def summary(self):
+        # End-to-end FPS and per-stage ms per item; FPS approaches the slowest stage rather than the sum of stages
+        n = max(self.n, 1)
+        s = ', '.join(f'{k} {p.t / n * 1E3:.1f}ms' for k, p in self.dt.items())
+        slowest = max(self.dt, key=lambda k: self.dt[k].t)
+        return (f'Pipeline: {self.n} items in {self.t:.1f}s ({self.n / max(self.t, 1E-9):.1f} FPS), {s} per item, '
+                f'slowest stage {slowest}')
+
+
 class Timeout(contextlib.ContextDecorator):
     # YOLOv5 Timeout class. Usage: @Timeout(seconds) decorator or 'with Timeout(seconds):' context manager
     def __init__(self, seconds, *, timeout_msg='', suppress_timeout_errors=True):